@@ -1,23 +1,31 @@
 import logging
-from typing import TYPE_CHECKING, Any, Callable, Dict, Generator, List, Tuple, Type
+from functools import lru_cache
+from typing import IO, TYPE_CHECKING, Any, Callable, Dict, Generator, List, Tuple, Type
 
 from django import forms
 from django.contrib import admin, messages
 from django.contrib.admin.views.main import ChangeList
 from django.core.exceptions import ValidationError
 from django.core.files.uploadedfile import UploadedFile
+from django.core.paginator import Paginator
 from django.db import models
 from django.db.models.fields.reverse_related import OneToOneRel
 from django.http import HttpRequest
 from django.templatetags.static import static
-from django.urls import reverse_lazy as reverse
+from django.urls import NoReverseMatch, reverse_lazy as reverse
+from django.utils.decorators import method_decorator
 from django.utils.html import format_html
 from django.utils.safestring import mark_safe
 from django.utils.translation import gettext_lazy as _
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
 
 from bankreader.readers import get_reader_choices
 
-from .models import Account, AccountStatement, Transaction
+from .ingest import IngestError, IngestResult, Pipeline
+from .models import Account, AccountStatement, ImportRun, IngestJob, Transaction
+from .pagination import EstimatedCountPaginator, KeysetChangeList
+from .preview import StatementPreview
+from .uploadhandler import StatementUploadHandler, StreamedStatement, StreamedUploadedFile
 
 logger = logging.getLogger(__name__)
 
@@ -31,10 +39,20 @@ if TYPE_CHECKING:
         transactions_count: int
 
 
+@lru_cache(maxsize=None)
 def get_transaction_relations() -> Dict[str, OneToOneRel]:
     return {rel.name: rel for rel in Transaction._meta.related_objects if isinstance(rel, OneToOneRel)}  # type: ignore
 
 
+@lru_cache(maxsize=None)
+def get_admin_url(model: Type[models.Model], view: str) -> str:
+    """Return URL of the admin view (changelist, add) of given model or "" if it has none."""
+    try:
+        return str(reverse(f"admin:{model._meta.app_label}_{model._meta.model_name}_{view}"))
+    except NoReverseMatch:
+        return ""
+
+
 class AmountFieldListFilter(admin.FieldListFilter):
     def __init__(
         self,
@@ -73,6 +91,13 @@ class AmountFieldListFilter(admin.FieldListFilter):
 
 
 class IdentifiedFieldListFilter(admin.RelatedFieldListFilter):
+    def field_choices(self, field: models.Field, request: HttpRequest, model_admin: admin.ModelAdmin) -> list:
+        # only the isnull lookups are offered, so there is no need to query the related objects
+        return []
+
+    def has_output(self) -> bool:
+        return True
+
     def choices(self, changelist: ChangeList) -> Generator[dict[str, Any], None, None]:
         yield {
             "selected": self.lookup_val_isnull is None,
@@ -93,7 +118,7 @@ class IdentifiedFieldListFilter(admin.RelatedFieldListFilter):
 
 @admin.register(Account)
 class AccountAdmin(admin.ModelAdmin):
-    list_display = ("name", "iban", "bic", "account_statements_link")
+    list_display = ("name", "iban", "bic", "account_statements_link", "upload_link")
 
     def get_queryset(self, request: HttpRequest) -> models.QuerySet["AccountWithStatementsCount"]:
         return super().get_queryset(request).annotate(account_statements_count=models.Count("account_statements"))
@@ -110,6 +135,12 @@ class AccountAdmin(admin.ModelAdmin):
             )
         )
 
+    account_statement_add = reverse("admin:bankreader_accountstatement_add")
+
+    @admin.display(description=_("upload"))
+    def upload_link(self, obj: Account) -> str:
+        return format_html('<a href="{}?account={}">{}</a>', self.account_statement_add, obj.id, _("upload statement"))
+
     def formfield_for_dbfield(self, db_field: models.Field, request: HttpRequest, **kwargs: Any) -> forms.Field | None:
         if db_field.name == "reader":
             return forms.ChoiceField(choices=get_reader_choices())
@@ -121,40 +152,80 @@ class ReadOnlyMixin:
         return False
 
 
+class KeysetPaginationMixin:
+    """Use estimated counts and keyset pagination, requires descending ordering by keyset_field."""
+
+    keyset_field: str
+    paginator: Type[Paginator] = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_changelist(self, request: HttpRequest, **kwargs: Any) -> Type[ChangeList]:
+        return KeysetChangeList
+
+
 class AccountStatementForm(forms.ModelForm):
     statement = forms.FileField(label=_("account statement"))
-    transactions: tuple[Transaction, ...] | None = None
+    preview = forms.BooleanField(
+        label=_("preview only"),
+        help_text=_("Only read the account statement and show a summary without saving anything."),
+        required=False,
+    )
+    statement_file: IO | StreamedStatement | None = None
+    checked: IngestResult | None = None
 
     def clean(self) -> dict[str, Any]:
         account: Account | None = self.cleaned_data.get("account")
         statement: UploadedFile | None = self.cleaned_data.get("statement")
-        if account is None or statement is None or statement.file is None:
+        if account is None or statement is None:
+            return self.cleaned_data
+        # statement read while it was being uploaded has no file
+        statement_file = statement.streamed if isinstance(statement, StreamedUploadedFile) else statement.file
+        if statement_file is None:
             return self.cleaned_data
         reader = account.get_reader()
         assert reader is not None
+        if isinstance(statement_file, StreamedStatement) and statement_file.account.pk != account.pk:
+            raise ValidationError(
+                _('The account statement was read for account "{}", upload it again.').format(statement_file.account)
+            )
+        if self.cleaned_data.get("preview"):
+            try:
+                if isinstance(statement_file, StreamedStatement):
+                    preview = StatementPreview(account).read_transactions(statement_file.wait(), statement_file.size)
+                else:
+                    preview = StatementPreview(account).read(reader, statement_file)
+            except Exception:
+                msg = _("Failed to read transaction data in format {}.").format(reader.label)
+                logger.exception(msg)
+                raise ValidationError(msg)
+            # the preview is shown as a form error, so that nothing gets saved
+            raise ValidationError(_("Preview: {}").format(preview))
+        # the statement is only read here, it is imported by AccountStatementAdmin.save_model
         try:
-            self.transactions = tuple(reader.read_file(statement.file))
-        except Exception:
-            msg = _("Failed to read transaction data in format {}.").format(reader.label)
-            logger.exception(msg)
-            raise ValidationError(msg)
-        if not self.transactions:
-            raise ValidationError(_("The account statement doesn't contain any transaction data."))
+            self.checked = Pipeline(account).check(statement_file)
+        except IngestError as e:
+            logger.exception(str(e))
+            raise ValidationError(str(e))
+        self.statement_file = statement_file
         return self.cleaned_data
 
 
 @admin.register(AccountStatement)
-class AccountStatementAdmin(ReadOnlyMixin, admin.ModelAdmin):
+class AccountStatementAdmin(ReadOnlyMixin, KeysetPaginationMixin, admin.ModelAdmin):
     form = AccountStatementForm
+    keyset_field = "to_date"
     list_display = (
         "id",
         "statement",
         "account_name",
         "from_date",
         "to_date",
+        "opening_balance",
+        "closing_balance",
+        "incomplete",
         "transactions_link",
     )
-    list_filter = ("account",)
+    list_filter = ("account", "incomplete")
     ordering = ("-to_date",)
 
     def get_queryset(self, request: HttpRequest) -> models.QuerySet["AccountStatementWithTransactionsCount"]:
@@ -165,6 +236,27 @@ class AccountStatementAdmin(ReadOnlyMixin, admin.ModelAdmin):
             .annotate(transactions_count=models.Count("transactions"))
         )
 
+    @method_decorator(csrf_exempt)
+    def add_view(self, request: HttpRequest, form_url: str = "", extra_context: dict[str, Any] | None = None) -> Any:
+        # upload handlers can not be changed once the request body was read by the CSRF check,
+        # so they are set before the CSRF protected view is called
+        account = self.get_upload_account(request)
+        if account is not None:
+            request.upload_handlers = [StatementUploadHandler(request, account), *request.upload_handlers]
+        return self.protected_add_view(request, form_url, extra_context)
+
+    @method_decorator(csrf_protect)
+    def protected_add_view(
+        self, request: HttpRequest, form_url: str = "", extra_context: dict[str, Any] | None = None
+    ) -> Any:
+        return super().add_view(request, form_url, extra_context)
+
+    def get_upload_account(self, request: HttpRequest) -> Account | None:
+        """Return account given by the URL (e.g. add/?account=1), whose statement may be read while uploading."""
+        if request.method != "POST" or not request.GET.get("account", "").isdigit():
+            return None
+        return Account.objects.filter(pk=int(request.GET["account"])).first()
+
     @admin.display(description=_("account"), ordering="account__name")
     def account_name(self, obj: AccountStatement) -> str:
         return obj.account.name
@@ -188,15 +280,44 @@ class AccountStatementAdmin(ReadOnlyMixin, admin.ModelAdmin):
         form: AccountStatementForm,
         change: bool,
     ) -> None:
-        assert form.transactions is not None
-        for message in obj.save_with_transactions(form.transactions):
+        assert form.statement_file is not None
+        obj.statement = form.cleaned_data["statement"].name or ""
+        result = Pipeline(obj.account).run(form.statement_file, obj.statement, obj, form.checked)
+        for message in result.messages:
             messages.warning(request, message)
         messages.success(request, _("Account statement was successfully loaded."))
 
 
+@admin.register(ImportRun)
+class ImportRunAdmin(ReadOnlyMixin, admin.ModelAdmin):
+    list_display = (
+        "created",
+        "account",
+        "reader",
+        "file_name",
+        "file_size",
+        "total_count",
+        "new_count",
+        "duplicate_count",
+        "failed_count",
+        "read_duration",
+        "save_duration",
+        "duration",
+        "peak_memory",
+    )
+    list_filter = ("account", "reader")
+    list_select_related = ("account",)
+    ordering = ("-created",)
+
+    def has_add_permission(self, request: HttpRequest) -> bool:
+        return False
+
+
 @admin.register(Transaction)
-class TransactionAdmin(ReadOnlyMixin, admin.ModelAdmin):
+class TransactionAdmin(ReadOnlyMixin, KeysetPaginationMixin, admin.ModelAdmin):
     date_hierarchy = "accounted_date"
+    keyset_field = "accounted_date"
+    search_fields = ("sender_description", "recipient_description", "remote_account_name")
     ordering = ("-accounted_date",)
     list_filter = [
         "account_statement__account",
@@ -213,64 +334,49 @@ class TransactionAdmin(ReadOnlyMixin, admin.ModelAdmin):
             yield field.name
 
         for relation in get_transaction_relations().values():
-            assert isinstance(relation.related_model, type(models.Model))
-            RelatedModel: type[models.Model] = relation.related_model
-
-            can_add = request.user.has_perm(f"{RelatedModel._meta.app_label}.add_{RelatedModel._meta.model_name}")
-            can_see = request.user.has_perm(f"{RelatedModel._meta.app_label}.view_{RelatedModel._meta.model_name}")
-
-            changelist_url = (
-                reverse(
-                    "admin:{}_{}_changelist".format(
-                        RelatedModel._meta.app_label,
-                        RelatedModel._meta.model_name,
-                    )
-                )
-                if can_see
-                else ""
-            )
-
-            add_url = (
-                reverse(
-                    "admin:{}_{}_add".format(
-                        RelatedModel._meta.app_label,
-                        RelatedModel._meta.model_name,
-                    )
-                )
-                if can_add
-                else ""
-            )
-
-            @admin.display(description=RelatedModel._meta.verbose_name)
-            def related_object_link(obj: Transaction) -> str:
-                try:
-                    related_object = getattr(obj, relation.name)
-                except RelatedModel.DoesNotExist:  # type: ignore
-                    related_object = None
-                if related_object:
-                    return (
-                        format_html(
-                            '<a href="{changelist_url}?{remote_name}__id__exact={obj_id}">{text}</a>',
-                            changelist_url=changelist_url,
-                            remote_name=relation.remote_field.name,
-                            obj_id=obj.id,
-                            text=str(related_object),
-                        )
-                        if can_see
-                        else str(related_object)
-                    )
-                elif can_add:
-                    return format_html(
-                        '<a href="{add_url}?{remote_name}={obj_id}" title="{title}">' '<img src="{icon}" alt="+"/></a>',
-                        add_url=add_url,
+            yield self.get_related_object_link(request, relation)
+
+    def get_related_object_link(self, request: HttpRequest, relation: OneToOneRel) -> Callable[[Transaction], str]:
+        assert isinstance(relation.related_model, type(models.Model))
+        RelatedModel: type[models.Model] = relation.related_model
+
+        can_add = request.user.has_perm(f"{RelatedModel._meta.app_label}.add_{RelatedModel._meta.model_name}")
+        can_see = request.user.has_perm(f"{RelatedModel._meta.app_label}.view_{RelatedModel._meta.model_name}")
+
+        changelist_url = get_admin_url(RelatedModel, "changelist") if can_see else ""
+        add_url = get_admin_url(RelatedModel, "add") if can_add else ""
+
+        @admin.display(description=RelatedModel._meta.verbose_name)
+        def related_object_link(obj: Transaction) -> str:
+            try:
+                related_object = getattr(obj, relation.name)
+            except RelatedModel.DoesNotExist:  # type: ignore
+                related_object = None
+            if related_object:
+                return (
+                    format_html(
+                        '<a href="{changelist_url}?{remote_name}__id__exact={obj_id}">{text}</a>',
+                        changelist_url=changelist_url,
                         remote_name=relation.remote_field.name,
                         obj_id=obj.id,
-                        title=_("add"),
-                        icon=static("admin/img/icon-addlink.svg"),
+                        text=str(related_object),
                     )
-                return "-"
+                    if changelist_url
+                    else str(related_object)
+                )
+            elif add_url:
+                return format_html(
+                    '<a href="{add_url}?{remote_name}={obj_id}" title="{title}">' '<img src="{icon}" alt="+"/></a>',
+                    add_url=add_url,
+                    remote_name=relation.remote_field.name,
+                    obj_id=obj.id,
+                    title=_("add"),
+                    icon=static("admin/img/icon-addlink.svg"),
+                )
+            return "-"
 
-            yield related_object_link
+        setattr(related_object_link, "relation_name", relation.name)
+        return related_object_link
 
     def get_list_filter(  # type: ignore
         self,
@@ -279,19 +385,48 @@ class TransactionAdmin(ReadOnlyMixin, admin.ModelAdmin):
         return self.list_filter + [(name, IdentifiedFieldListFilter) for name in get_transaction_relations()]
 
     def get_queryset(self, request: HttpRequest) -> models.QuerySet[Transaction]:
+        # related objects of the displayed relations are loaded with one query per relation for the whole page
         return (
             super()
             .get_queryset(request)
-            .select_related(
-                "account",
-                "account_statement",
-                *(name for name in get_transaction_relations()),
+            .select_related("account", "account_statement")
+            .prefetch_related(
+                *(
+                    getattr(field, "relation_name")
+                    for field in self.get_list_display(request)
+                    if hasattr(field, "relation_name")
+                )
             )
         )
 
+    def get_search_results(
+        self, request: HttpRequest, queryset: models.QuerySet[Transaction], search_term: str
+    ) -> Tuple[models.QuerySet[Transaction], bool]:
+        return queryset.search(search_term), False  # type: ignore
+
     def has_add_permission(self, request: HttpRequest) -> bool:
         return False
 
     @admin.display(description=_("account statement"), ordering="account_statement__statement")
     def statement(self, obj: Transaction) -> str:
         return obj.account_statement.statement
+
+
+@admin.register(IngestJob)
+class IngestJobAdmin(ReadOnlyMixin, admin.ModelAdmin):
+    list_display = (
+        "created",
+        "account",
+        "file_name",
+        "status",
+        "attempts",
+        "worker",
+        "leased_until",
+        "import_run",
+    )
+    list_filter = ("status", "account")
+    list_select_related = ("account", "import_run")
+    ordering = ("-created",)
+
+    def has_add_permission(self, request: HttpRequest) -> bool:
+        return False
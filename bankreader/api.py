@@ -0,0 +1,124 @@
+"""
+Read-only JSON API for accounts, account statements and transactions.
+
+Lists are ordered by date and id and paginated using cursors, so that reading
+any page takes constant time. Responses carry ETag and Last-Modified headers
+derived from the version of the data (see ``DataVersion``), which changes with every
+committed change of accounts, account statements and transactions, so that polling
+clients mostly receive cheap 304 responses.
+"""
+
+import datetime
+from typing import Any, Callable, Dict, Iterable, List
+
+from django.db.models import Q, QuerySet
+from django.http import HttpRequest, HttpResponse, JsonResponse
+from django.views.decorators.http import condition, require_GET
+
+from .models import Account, AccountStatement, DataVersion, Transaction
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+
+class BadRequest(Exception):
+    pass
+
+
+def get_etag(request: HttpRequest, **kwargs: Any) -> str:
+    return '"%d"' % DataVersion.get_current().version
+
+
+def get_last_modified(request: HttpRequest, **kwargs: Any) -> datetime.datetime | None:
+    data_version = DataVersion.get_current()
+    return data_version.updated if data_version.version else None
+
+
+def api_view(permission: str) -> Callable:
+    def decorator(view: Callable[[HttpRequest], Dict[str, Any]]) -> Callable[[HttpRequest], HttpResponse]:
+        @condition(etag_func=get_etag, last_modified_func=get_last_modified)
+        def conditional_view(request: HttpRequest) -> HttpResponse:
+            try:
+                return JsonResponse(view(request))
+            except (BadRequest, ValueError) as e:
+                return JsonResponse({"error": str(e)}, status=400)
+
+        @require_GET
+        def wrapper(request: HttpRequest) -> HttpResponse:
+            if not request.user.has_perm(permission):
+                return JsonResponse({"error": "Permission denied."}, status=403)
+            return conditional_view(request)
+
+        return wrapper
+
+    return decorator
+
+
+def get_limit(request: HttpRequest) -> int:
+    limit = int(request.GET.get("limit", DEFAULT_LIMIT))
+    if not 0 < limit <= MAX_LIMIT:
+        raise BadRequest("Limit must be between 1 and %d." % MAX_LIMIT)
+    return limit
+
+
+def filter_dates(request: HttpRequest, queryset: QuerySet, field_name: str) -> QuerySet:
+    if "date_from" in request.GET:
+        queryset = queryset.filter(**{f"{field_name}__gte": datetime.date.fromisoformat(request.GET["date_from"])})
+    if "date_to" in request.GET:
+        queryset = queryset.filter(**{f"{field_name}__lte": datetime.date.fromisoformat(request.GET["date_to"])})
+    return queryset
+
+
+def paginate(request: HttpRequest, queryset: QuerySet, field_name: str, fields: Iterable[str]) -> Dict[str, Any]:
+    """Return page of the queryset ordered by (field_name, id), starting after the cursor."""
+    limit = get_limit(request)
+    cursor = request.GET.get("cursor")
+    if cursor:
+        value, _, pk = cursor.rpartition(".")
+        date = datetime.date.fromisoformat(value)
+        queryset = queryset.filter(Q(**{f"{field_name}__gt": date}) | Q(**{field_name: date, "pk__gt": int(pk)}))
+    # one more row tells whether there is a next page
+    count = limit + 1
+    results: List[Dict[str, Any]] = list(queryset.order_by(field_name, "pk").values(*fields)[:count])
+    next_url = None
+    if len(results) > limit:
+        results = results[:limit]
+        query = request.GET.copy()
+        query["cursor"] = "%s.%s" % (results[-1][field_name].isoformat(), results[-1]["id"])
+        next_url = request.build_absolute_uri("?" + query.urlencode())
+    return {"results": results, "next": next_url}
+
+
+def filter_account(request: HttpRequest, queryset: QuerySet) -> QuerySet:
+    if "account" in request.GET:
+        queryset = queryset.filter(account_id=int(request.GET["account"]))
+    return queryset
+
+
+@api_view("bankreader.view_account")
+def accounts(request: HttpRequest) -> Dict[str, Any]:
+    return {"results": list(Account.objects.order_by("pk").values("id", "name", "iban", "bic", "reader"))}
+
+
+@api_view("bankreader.view_accountstatement")
+def account_statements(request: HttpRequest) -> Dict[str, Any]:
+    queryset = filter_dates(request, filter_account(request, AccountStatement.objects.all()), "from_date")
+    return paginate(
+        request, queryset, "from_date", ("id", "account_id", "statement", "from_date", "to_date", "incomplete")
+    )
+
+
+@api_view("bankreader.view_transaction")
+def transactions(request: HttpRequest) -> Dict[str, Any]:
+    queryset = filter_dates(request, filter_account(request, Transaction.objects.all()), "accounted_date")
+    if "account_statement" in request.GET:
+        queryset = queryset.filter(account_statement_id=int(request.GET["account_statement"]))
+    for symbol in ("variable_symbol", "constant_symbol", "specific_symbol"):
+        if symbol in request.GET:
+            queryset = queryset.filter(**{symbol: int(request.GET[symbol])})
+    return paginate(
+        request,
+        queryset,
+        "accounted_date",
+        ("id", *(field.attname for field in Transaction._meta.fields[1:])),
+    )
@@ -0,0 +1,73 @@
+"""
+Cached index of months containing transactions, kept per account.
+
+It is used instead of DISTINCT date queries over the whole transaction table,
+e.g. for the date hierarchy of the transaction admin.
+"""
+
+import datetime
+from typing import Dict, Iterable, List, Tuple
+
+from django.conf import settings
+from django.core.cache import BaseCache, caches
+from django.db.models.functions import ExtractMonth, ExtractYear
+
+from .oncommit import collect_on_commit
+
+Month = Tuple[int, int]
+
+CACHE_KEY = "bankreader:transaction-months:%s"
+
+
+def get_cache() -> BaseCache:
+    return caches[getattr(settings, "BANKREADER_CACHE", "default")]
+
+
+def get_months(account_ids: Iterable[int]) -> Dict[int, List[Month]]:
+    """Return sorted (year, month) pairs with any transactions for each of given accounts."""
+    from .models import Transaction
+
+    cache = get_cache()
+    keys = {account_id: CACHE_KEY % account_id for account_id in account_ids}
+    cached = cache.get_many(keys.values())
+    months: Dict[int, List[Month]] = {
+        account_id: [tuple(month) for month in cached[key]] for account_id, key in keys.items() if key in cached
+    }
+    missing = [account_id for account_id in keys if account_id not in months]
+    if missing:
+        for account_id in missing:
+            months[account_id] = []
+        for account_id, year, month in (
+            Transaction.objects.filter(account_id__in=missing)
+            .annotate(year=ExtractYear("accounted_date"), month=ExtractMonth("accounted_date"))
+            .values_list("account_id", "year", "month")
+            .order_by("account_id", "year", "month")
+            .distinct()
+        ):
+            months[account_id].append((year, month))
+        cache.set_many({keys[account_id]: months[account_id] for account_id in missing}, None)
+    return months
+
+
+def add_dates(account_id: int, dates: Iterable[datetime.date]) -> None:
+    """Add months of given dates to the index of the account, if it is already cached."""
+    cache = get_cache()
+    key = CACHE_KEY % account_id
+    cached = cache.get(key)
+    if cached is not None:
+        months = {tuple(month) for month in cached} | {(date.year, date.month) for date in dates}
+        cache.set(key, sorted(months), None)
+
+
+def invalidate(account_id: int) -> None:
+    get_cache().delete(CACHE_KEY % account_id)
+
+
+def invalidate_on_commit(account_id: int, using: str) -> None:
+    """Invalidate the index of the account once the current database transaction is committed."""
+    collect_on_commit(
+        "date_index",
+        account_id,
+        lambda account_ids: get_cache().delete_many([CACHE_KEY % account_id for account_id in account_ids]),
+        using,
+    )
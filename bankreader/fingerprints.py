@@ -0,0 +1,72 @@
+"""
+Fingerprints of already stored transactions.
+
+Transactions imported before their reader started to use ``FINGERPRINT`` as the duplicate key
+have no fingerprints, and would be imported again from any overlapping statement.
+The fingerprints are computed from the stored fields in the order of the transactions in each statement,
+the same way the reader computes them while reading the statement file.
+"""
+
+from itertools import groupby
+from operator import attrgetter
+from typing import Any, List, Set, Tuple, Type
+
+from django.db.models import Model
+
+from .readers.base import BaseReader
+
+BATCH_SIZE = 500
+
+
+def fill_fingerprints(
+    reader: BaseReader,
+    account_id: int,
+    transaction_model: Type[Model],
+    archived_transaction_model: Type[Model],
+    using: str,
+) -> Tuple[int, int]:
+    """
+    Set missing fingerprints of transactions of the account and return numbers of filled and conflicting ones.
+
+    The models are passed as arguments, so that migrations may use their historical versions.
+    Transactions with the fingerprint of another transaction of the account (e.g. equal payments imported
+    from different statements) are left without it and still recognized by their transaction id.
+    """
+    transactions = transaction_model.objects.using(using).filter(account_id=account_id)  # type: ignore
+    if not transactions.filter(fingerprint="").exists():
+        return 0, 0
+    existing: Set[str] = set()
+    for model in (transaction_model, archived_transaction_model):
+        existing.update(
+            model.objects.using(using)  # type: ignore
+            .filter(account_id=account_id)
+            .exclude(fingerprint="")
+            .values_list("fingerprint", flat=True)
+        )
+    filled: List[Any] = []
+    count = conflicts = 0
+    rows = transactions.order_by("account_statement_id", "pk").iterator()
+    for _, group in groupby(rows, key=attrgetter("account_statement_id")):
+        statement = list(group)
+        missing = {transaction.pk for transaction in statement if not transaction.fingerprint}
+        for transaction in reader.set_fingerprints(statement):
+            if transaction.pk not in missing:
+                continue
+            if transaction.fingerprint in existing:
+                conflicts += 1
+                continue
+            existing.add(transaction.fingerprint)
+            filled.append(transaction)
+        if len(filled) >= BATCH_SIZE:
+            count += save_fingerprints(transaction_model, filled, using)
+            filled = []
+    count += save_fingerprints(transaction_model, filled, using)
+    return count, conflicts
+
+
+def save_fingerprints(transaction_model: Type[Model], transactions: List[Any], using: str) -> int:
+    if transactions:
+        transaction_model.objects.using(using).bulk_update(  # type: ignore
+            transactions, ["fingerprint", "transaction_id"], batch_size=BATCH_SIZE
+        )
+    return len(transactions)
@@ -0,0 +1,845 @@
+"""
+Pipeline reading account statements and saving their transactions.
+
+The stages are methods of ``Pipeline``, which may be overridden in a subclass to tune or replace them:
+
+* ``open`` - computes digest of the statement file and keeps it in the statement store
+* ``read_balances`` - reads opening and closing balance from the statement headers
+* ``read`` - unzips, decodes and parses the file using the reader of the account
+* ``batch`` - splits transactions into batches of ``batch_size``
+* ``dedupe`` - drops transactions already imported to the account
+* ``set_balances`` - sets running balances of new transactions
+* ``verify_balances`` - checks the transactions against opening and closing balance
+* ``persist`` - saves new transactions
+* ``post_process`` - updates search and date indexes
+
+Reading runs in a background thread, which passes batches to the other stages through a queue
+of ``queue_size`` batches. A slow database thus throttles reading instead of letting parsed
+transactions pile up in memory. All the transactions of a statement are saved in a single
+database transaction, so a statement which fails to be read or saved is not imported at all.
+Statements read while being uploaded (see ``bankreader.uploadhandler``) skip the ``open``,
+``read_balances`` and ``read`` stages. ``check`` runs just the reading stages and checks the balances,
+e.g. to validate a statement before it is imported.
+"""
+
+import datetime
+import io
+import itertools
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import tracemalloc
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from decimal import Decimal
+from typing import IO, Deque, Dict, Iterable, Iterator, List, Set, Tuple
+from zipfile import is_zipfile
+
+from django.db import DEFAULT_DB_ALIAS, connections, router, transaction as db_transaction
+from django.db.models.signals import post_save
+from django.utils.translation import gettext
+
+from . import date_index, metrics, search, shards, storage
+from .models import LOOKUP_BATCH_SIZE, Account, AccountStatement, ImportRun, Transaction
+from .readers.base import FINGERPRINT, BaseReader, normalize_account_number
+from .uploadhandler import StreamedStatement
+
+
+class IngestError(Exception):
+    """The account statement could not be read or doesn't contain any transactions."""
+
+
+class IngestResult:
+    """Statistics of a single account statement ingestion."""
+
+    def __init__(self) -> None:
+        self.account_statement: AccountStatement | None = None
+        self.count = 0
+        self.new_count = 0
+        self.duplicate_count = 0
+        self.messages: List[str] = []
+        self.from_date: datetime.date | None = None
+        self.to_date: datetime.date | None = None
+        self.opening_balance: Decimal | None = None
+        self.closing_balance: Decimal | None = None
+        self.amount = Decimal(0)
+        # transactions read by Pipeline.check(), which may be passed to Pipeline.run()
+        self.transactions: List[Transaction] = []
+        self.read_duration = 0.0
+        self.save_duration = 0.0
+        self.duration = 0.0
+
+    def __str__(self) -> str:
+        return gettext(
+            "{count} transactions ({new_count} new, {duplicate_count} duplicate) from {from_date} to {to_date} "
+            "in {duration:.3f} s."
+        ).format(
+            count=self.count,
+            new_count=self.new_count,
+            duplicate_count=self.duplicate_count,
+            from_date=self.from_date,
+            to_date=self.to_date,
+            duration=self.duration,
+        )
+
+
+class _ReadFailure:
+    def __init__(self, exception: Exception) -> None:
+        self.exception = exception
+
+
+# marks the end of the queue
+_DONE = object()
+
+
+class Pipeline:
+    batch_size = LOOKUP_BATCH_SIZE
+    queue_size = 4
+
+    def __init__(self, account: Account, batch_size: int | None = None, queue_size: int | None = None) -> None:
+        self.account = account
+        self.reader: BaseReader | None = account.get_reader()
+        self.import_run: ImportRun | None = None
+        self.key_field = account.get_duplicate_key()
+        if batch_size is not None:
+            self.batch_size = batch_size
+        if queue_size is not None:
+            self.queue_size = queue_size
+
+    def run(
+        self,
+        statement_file: IO | StreamedStatement,
+        file_name: str,
+        account_statement: AccountStatement | None = None,
+        checked: IngestResult | None = None,
+    ) -> IngestResult:
+        """
+        Read the statement file and save its transactions, recording the import run.
+
+        Transactions of the ``checked`` result of ``check()`` are saved without reading the file again.
+        """
+        if self.reader is None:
+            raise IngestError(gettext('Account "{}" has no account statement format.').format(self.account))
+        self.import_run = import_run = ImportRun(
+            account=self.account, reader=self.account.reader or "", file_name=file_name
+        )
+        result = IngestResult()
+        if account_statement is None:
+            account_statement = AccountStatement(account=self.account, statement=file_name)
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        start = time.monotonic()
+        try:
+            batches: Iterable[List[Transaction]]
+            if isinstance(statement_file, StreamedStatement):
+                import_run.digest, import_run.file_size = statement_file.digest, statement_file.size
+            else:
+                import_run.digest, import_run.file_size = self.open(statement_file)
+            if checked is not None:
+                result.opening_balance, result.closing_balance = checked.opening_balance, checked.closing_balance
+                result.read_duration = checked.read_duration
+                batches = self.batch(checked.transactions)
+            elif isinstance(statement_file, StreamedStatement):
+                batches = self.read_streamed(statement_file, result)
+            else:
+                batches = self.read_in_background(statement_file, result)
+            account_statement.digest = import_run.digest
+            self.save_batches(account_statement, batches, result)
+            if not result.count:
+                raise IngestError(gettext("The account statement doesn't contain any transaction data."))
+        except Exception as e:
+            # saving of the account statement was rolled back
+            account_statement.pk = None
+            import_run.error = str(e)
+            import_run.failed_count = result.count
+            result.new_count = result.duplicate_count = 0
+            raise
+        finally:
+            result.duration = time.monotonic() - start
+            import_run.account_statement = result.account_statement
+            import_run.total_count = result.count
+            import_run.new_count = result.new_count
+            import_run.duplicate_count = result.duplicate_count
+            import_run.read_duration = result.read_duration
+            import_run.save_duration = result.save_duration
+            import_run.duration = result.duration
+            if tracemalloc.is_tracing():
+                import_run.peak_memory = tracemalloc.get_traced_memory()[1]
+            import_run.save()
+        return result
+
+    def check(self, statement_file: IO | StreamedStatement) -> IngestResult:
+        """
+        Read the statement file without saving anything, raise IngestError if it could not be imported.
+
+        The read transactions are kept in the result, so that ``run()`` may save them.
+        """
+        if self.reader is None:
+            raise IngestError(gettext('Account "{}" has no account statement format.').format(self.account))
+        result = IngestResult()
+        batches: Iterable[List[Transaction]]
+        if isinstance(statement_file, StreamedStatement):
+            batches = self.read_streamed(statement_file, result)
+        else:
+            batches = self.read_in_background(statement_file, result)
+        for transactions in batches:
+            result.count += len(transactions)
+            result.amount += sum(transaction.amount for transaction in transactions)
+            result.transactions.extend(transactions)
+        if not result.count:
+            raise IngestError(gettext("The account statement doesn't contain any transaction data."))
+        self.verify_balances(result)
+        return result
+
+    def save(self, account_statement: AccountStatement, transactions: Iterable[Transaction]) -> IngestResult:
+        """Save transactions, which were already read, with the account statement."""
+        result = IngestResult()
+        start = time.monotonic()
+        self.save_batches(account_statement, self.batch(transactions), result)
+        result.duration = time.monotonic() - start
+        return result
+
+    def save_batches(
+        self, account_statement: AccountStatement, batches: Iterable[List[Transaction]], result: IngestResult
+    ) -> None:
+        existing_keys: Set[str] = set()
+        with db_transaction.atomic(using=router.db_for_write(AccountStatement)):
+            # imports for the same account are serialized, imports for different accounts may run in parallel
+            self.account.lock()
+            balance: Decimal | None = None
+            balance_date: datetime.date | None = None
+            for transactions in batches:
+                balance, balance_date = self.save_batch(
+                    account_statement, transactions, result, existing_keys, balance, balance_date
+                )
+            self.complete(account_statement, result)
+        self.observe(result.save_duration, result.new_count, result.duplicate_count)
+
+    def save_batch(
+        self,
+        account_statement: AccountStatement,
+        transactions: List[Transaction],
+        result: IngestResult,
+        existing_keys: Set[str],
+        balance: Decimal | None,
+        balance_date: datetime.date | None,
+    ) -> Tuple[Decimal | None, datetime.date | None]:
+        """Save the batch (and the account statement with the first one), return balance after the batch."""
+        start = time.monotonic()
+        result.count += len(transactions)
+        result.amount += sum(transaction.amount for transaction in transactions)
+        from_date = min(transaction.accounted_date for transaction in transactions)
+        to_date = max(transaction.accounted_date for transaction in transactions)
+        result.from_date = min(from_date, result.from_date or from_date)
+        result.to_date = max(to_date, result.to_date or to_date)
+        if account_statement.pk is None:
+            # balances are read before the first batch is passed
+            balance, balance_date = self.get_initial_balance(result)
+            account_statement.from_date = result.from_date
+            account_statement.to_date = result.to_date
+            account_statement.opening_balance = result.opening_balance
+            account_statement.closing_balance = result.closing_balance
+            account_statement.save()
+        new_transactions, messages = self.dedupe(transactions, existing_keys)
+        balance, balance_date = self.set_balances(transactions, new_transactions, balance, balance_date)
+        result.messages.extend(messages)
+        result.duplicate_count += len(messages)
+        result.new_count += len(new_transactions)
+        self.persist(account_statement, new_transactions)
+        self.post_process(account_statement, new_transactions)
+        result.save_duration += time.monotonic() - start
+        return balance, balance_date
+
+    def complete(self, account_statement: AccountStatement, result: IngestResult) -> None:
+        """Verify balances and update dates of the account statement after all batches were saved."""
+        self.verify_balances(result)
+        if result.from_date is not None and result.to_date is not None:
+            self.save_dates(account_statement, result)
+            result.account_statement = account_statement
+
+    def save_dates(self, account_statement: AccountStatement, result: IngestResult) -> None:
+        """Save dates of the account statement, also marking it updated with each commit of its transactions."""
+        if result.from_date is None or result.to_date is None:
+            return
+        account_statement.from_date = result.from_date
+        account_statement.to_date = result.to_date
+        account_statement.save(update_fields=["from_date", "to_date", "updated"])
+
+    def observe(self, save_duration: float, new_count: int, duplicate_count: int) -> None:
+        labels = {"reader": self.account.reader or "", "account": self.account.name}
+        metrics.observe("bankreader_persist_duration_seconds", save_duration, **labels)
+        metrics.inc("bankreader_transactions_imported_total", new_count, **labels)
+        metrics.inc("bankreader_transactions_duplicate_total", duplicate_count, **labels)
+
+    def read_in_background(self, statement_file: IO, result: IngestResult) -> Iterator[List[Transaction]]:
+        """Run reading stages in a thread and yield the batches it produces."""
+        batches: queue.Queue = queue.Queue(self.queue_size)
+        stopped = threading.Event()
+
+        def put(item: object) -> bool:
+            # stop waiting for free space when the consumer fails
+            while not stopped.is_set():
+                try:
+                    batches.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def produce() -> None:
+            try:
+                start = time.monotonic()
+                result.opening_balance, result.closing_balance = self.read_balances(statement_file)
+                result.read_duration += time.monotonic() - start
+                iterator = iter(self.batch(self.read(statement_file)))
+                while True:
+                    start = time.monotonic()
+                    transactions = next(iterator, None)
+                    result.read_duration += time.monotonic() - start
+                    if transactions is None or not put(transactions):
+                        break
+            except Exception as e:
+                put(_ReadFailure(e))
+            put(_DONE)
+
+        thread = threading.Thread(target=produce, name="bankreader-read", daemon=True)
+        thread.start()
+        try:
+            while True:
+                item = batches.get()
+                if item is _DONE:
+                    break
+                if isinstance(item, _ReadFailure):
+                    assert self.reader is not None
+                    raise IngestError(
+                        gettext("Failed to read transaction data in format {}.").format(self.reader.label)
+                    ) from item.exception
+                yield item
+        finally:
+            stopped.set()
+            thread.join()
+
+    def read_streamed(self, streamed: StreamedStatement, result: IngestResult) -> Iterable[List[Transaction]]:
+        """Wait for the statement read while it was being uploaded and return its batches."""
+        assert self.reader is not None
+        start = time.monotonic()
+        try:
+            transactions = streamed.wait()
+        except Exception as e:
+            raise IngestError(gettext("Failed to read transaction data in format {}.").format(self.reader.label)) from e
+        finally:
+            result.read_duration += time.monotonic() - start
+        result.opening_balance, result.closing_balance = streamed.opening_balance, streamed.closing_balance
+        return self.batch(transactions)
+
+    def open(self, statement_file: IO) -> Tuple[str, int]:
+        """Return digest and size of the statement file, keeping it in the statement store if enabled."""
+        return storage.store_statement(statement_file)
+
+    def read(self, statement_file: IO) -> Iterable[Transaction]:
+        assert self.reader is not None
+        statement_file.seek(0, os.SEEK_SET)
+        return self.reader.read_file(statement_file)
+
+    def read_balances(self, statement_file: IO) -> Tuple[Decimal | None, Decimal | None]:
+        assert self.reader is not None
+        statement_file.seek(0, os.SEEK_SET)
+        return self.reader.read_balances(statement_file)
+
+    def batch(self, transactions: Iterable[Transaction]) -> Iterable[List[Transaction]]:
+        transactions_batch = []
+        for transaction in transactions:
+            transactions_batch.append(transaction)
+            if len(transactions_batch) >= self.batch_size:
+                yield transactions_batch
+                transactions_batch = []
+        if transactions_batch:
+            yield transactions_batch
+
+    def dedupe(self, transactions: List[Transaction], existing_keys: Set[str]) -> Tuple[List[Transaction], List[str]]:
+        """Return new transactions and messages about duplicate ones, adding keys of new ones to existing_keys."""
+        keys = {getattr(transaction, self.key_field) for transaction in transactions} - existing_keys
+        existing_keys.update(self.account.get_existing_keys(keys, self.key_field))
+        new_transactions = []
+        messages = []
+        for transaction in transactions:
+            key = getattr(transaction, self.key_field)
+            if key in existing_keys:
+                messages.append(
+                    gettext('Transaction "{transaction_id}" already exists for account "{account_name}".').format(
+                        transaction_id=transaction.transaction_id,
+                        account_name=self.account.name,
+                    )
+                )
+                continue
+            existing_keys.add(key)
+            new_transactions.append(transaction)
+        return new_transactions, messages
+
+    def get_initial_balance(self, result: IngestResult) -> Tuple[Decimal | None, datetime.date | None]:
+        if result.opening_balance is not None:
+            return result.opening_balance, None
+        # without balances in the statement, running balances continue from the last transaction
+        last_transaction = (
+            Transaction.objects.filter(account=self.account)
+            .order_by("-accounted_date", "-pk")
+            .values_list("accounted_date", "balance")
+            .first()
+        )
+        if last_transaction is None:
+            return None, None
+        return last_transaction[1], last_transaction[0]
+
+    def set_balances(
+        self,
+        transactions: List[Transaction],
+        new_transactions: List[Transaction],
+        balance: Decimal | None,
+        balance_date: datetime.date | None,
+    ) -> Tuple[Decimal | None, datetime.date | None]:
+        """Set running balances of new transactions, return the balance after the batch if it is known.
+
+        Balance continues either from the opening balance of the statement (balance_date is None)
+        through all its transactions, or from the last transaction of the account (on balance_date)
+        through the new transactions, as long as they do not precede it.
+        """
+        if balance is None:
+            return None, None
+        new_ids = {id(transaction) for transaction in new_transactions}
+        for transaction in transactions if balance_date is None else new_transactions:
+            if balance_date is not None:
+                if transaction.accounted_date < balance_date:
+                    # the transaction is inserted before already stored balances, which would not match anymore
+                    return None, None
+                balance_date = transaction.accounted_date
+            balance += transaction.amount
+            if id(transaction) in new_ids:
+                transaction.balance = balance
+        return balance, balance_date
+
+    def verify_balances(self, result: IngestResult) -> None:
+        """Check that the transactions add up to the difference between closing and opening balance."""
+        if result.opening_balance is None or result.closing_balance is None:
+            return
+        if result.opening_balance + result.amount != result.closing_balance:
+            raise IngestError(
+                gettext(
+                    "Opening balance {opening_balance} and transactions amount {amount} "
+                    "do not add up to closing balance {closing_balance}."
+                ).format(
+                    opening_balance=result.opening_balance,
+                    amount=result.amount,
+                    closing_balance=result.closing_balance,
+                )
+            )
+
+    def persist(self, account_statement: AccountStatement, transactions: List[Transaction]) -> None:
+        using = account_statement._state.db or DEFAULT_DB_ALIAS
+        for transaction in transactions:
+            transaction.account = self.account
+            transaction.account_statement = account_statement
+            transaction.set_missing_dates()
+        if not connections[using].features.can_return_rows_from_bulk_insert:
+            # primary keys are needed by the signal receivers and the search index
+            for transaction in transactions:
+                transaction.save(using=using)
+            return
+        Transaction.objects.using(using).bulk_create(transactions)
+        # post_save signals are sent as if the transactions were saved one by one
+        for transaction in transactions:
+            post_save.send(
+                sender=Transaction, instance=transaction, created=True, update_fields=None, raw=False, using=using
+            )
+
+    def post_process(self, account_statement: AccountStatement, transactions: List[Transaction]) -> None:
+        using = account_statement._state.db or DEFAULT_DB_ALIAS
+        search.index_transactions(transactions, using=using)
+        # rolled back imports must not add their months
+        dates = {transaction.accounted_date for transaction in transactions}
+        db_transaction.on_commit(lambda: date_index.add_dates(self.account.pk, dates), using=using)
+
+
+class ResumablePipeline(Pipeline):
+    """Pipeline committing transactions in chunks with a checkpoint on the import run.
+
+    Running it again for the same file (recognized by its digest) after it was interrupted, e.g. by
+    a deploy or a database failover, continues after the last committed transaction. Resumable readers
+    continue reading at the byte offset of the checkpoint, other readers read the file (or its ZIP member)
+    again, skipping the committed transactions, and readers using fingerprints read the whole file again.
+    Unlike with ``Pipeline``, committed transactions stay imported when the import fails later,
+    e.g. when the balances do not add up, and their account statement stays marked incomplete.
+    The account is only locked while a chunk is saved, so running balances continuing from the last
+    transaction of the account are read again for each chunk.
+    """
+
+    checkpoint_size = 10 * LOOKUP_BATCH_SIZE
+
+    def __init__(
+        self,
+        account: Account,
+        batch_size: int | None = None,
+        queue_size: int | None = None,
+        checkpoint_size: int | None = None,
+    ) -> None:
+        super().__init__(account, batch_size, queue_size)
+        if checkpoint_size is not None:
+            self.checkpoint_size = checkpoint_size
+
+    def get_unfinished_run(self, digest: str) -> ImportRun | None:
+        # a replica lagging behind the last checkpoint would make the import start again
+        return (
+            ImportRun.objects.using(router.db_for_write(ImportRun))
+            .filter(account=self.account, digest=digest, checkpoint__isnull=False, account_statement__isnull=False)
+            .select_related("account_statement")
+            .order_by("-pk")
+            .first()
+        )
+
+    def run(
+        self,
+        statement_file: IO | StreamedStatement,
+        file_name: str,
+        account_statement: AccountStatement | None = None,
+        checked: IngestResult | None = None,
+    ) -> IngestResult:
+        """Read the statement file and save its transactions, continuing an unfinished import of the file."""
+        if self.reader is None:
+            raise IngestError(gettext('Account "{}" has no account statement format.').format(self.account))
+        if checked is not None:
+            # transactions, which were already read, are saved at once
+            return super().run(statement_file, file_name, account_statement, checked)
+        if isinstance(statement_file, StreamedStatement):
+            raise IngestError(gettext("Statements read while being uploaded can not be imported in chunks."))
+        result = IngestResult()
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        start = time.monotonic()
+        digest, file_size = self.open(statement_file)
+        self.import_run = import_run = self.get_unfinished_run(digest)
+        if import_run is None:
+            self.import_run = import_run = ImportRun(
+                account=self.account,
+                reader=self.account.reader or "",
+                file_name=file_name,
+                digest=digest,
+                file_size=file_size,
+                checkpoint={
+                    "member": 0,
+                    "offset": 0,
+                    "skip": 0,
+                    "count": 0,
+                    "new_count": 0,
+                    "duplicate_count": 0,
+                    "amount": "0",
+                    "balance": None,
+                },
+            )
+            if account_statement is None:
+                account_statement = AccountStatement(account=self.account, statement=file_name)
+            account_statement.digest = digest
+            account_statement.incomplete = True
+        else:
+            # continue where the interrupted import stopped
+            assert import_run.account_statement is not None
+            account_statement = import_run.account_statement
+            result.count = import_run.checkpoint["count"]
+            result.amount = Decimal(import_run.checkpoint["amount"])
+            result.new_count = import_run.checkpoint["new_count"]
+            result.duplicate_count = import_run.checkpoint["duplicate_count"]
+            result.from_date = account_statement.from_date
+            result.to_date = account_statement.to_date
+            import_run.error = ""
+            import_run.failed_count = 0
+        previous_duration = import_run.duration
+        result.read_duration = import_run.read_duration
+        result.save_duration = import_run.save_duration
+        try:
+            self.save_batches(account_statement, self.read_in_background(statement_file, result), result)
+            if not result.count:
+                raise IngestError(gettext("The account statement doesn't contain any transaction data."))
+        except Exception as e:
+            import_run.error = str(e)
+            import_run.failed_count = result.count - import_run.checkpoint["count"]
+            if import_run.account_statement is None:
+                # nothing was committed, there is nothing to continue
+                import_run.checkpoint = None
+            raise
+        finally:
+            result.duration = previous_duration + time.monotonic() - start
+            import_run.total_count = result.count
+            import_run.new_count = result.new_count
+            import_run.duplicate_count = result.duplicate_count
+            import_run.read_duration = result.read_duration
+            import_run.save_duration = result.save_duration
+            import_run.duration = result.duration
+            if tracemalloc.is_tracing():
+                import_run.peak_memory = tracemalloc.get_traced_memory()[1]
+            import_run.save()
+        return result
+
+    def read(self, statement_file: IO) -> Iterable[Transaction]:
+        assert self.reader is not None and self.import_run is not None
+        checkpoint = self.import_run.checkpoint
+        statement_file.seek(0, os.SEEK_SET)
+        if self.reader.duplicate_key == FINGERPRINT:
+            # fingerprints of transactions depend on the preceding ones
+            return itertools.islice(self.reader.read_file(statement_file), checkpoint["count"], None)
+        return self.reader.read_file_from(
+            statement_file, checkpoint["member"], checkpoint["offset"], checkpoint["skip"]
+        )
+
+    def save_batches(
+        self, account_statement: AccountStatement, batches: Iterable[List[Transaction]], result: IngestResult
+    ) -> None:
+        assert self.import_run is not None
+        checkpoint = self.import_run.checkpoint
+        balance = None if checkpoint["balance"] is None else Decimal(checkpoint["balance"])
+        balance_date = (
+            None if not checkpoint.get("balance_date") else datetime.date.fromisoformat(checkpoint["balance_date"])
+        )
+        save_duration, new_count, duplicate_count = result.save_duration, result.new_count, result.duplicate_count
+        existing_keys: Set[str] = set()
+        db = router.db_for_write(AccountStatement)
+        for chunk in self.chunk(batches):
+            with db_transaction.atomic(using=db):
+                self.account.lock()
+                if balance_date is not None:
+                    # other imports of the account may have committed transactions since the previous chunk
+                    balance, balance_date = self.get_initial_balance(result)
+                for transactions in chunk:
+                    balance, balance_date = self.save_batch(
+                        account_statement, transactions, result, existing_keys, balance, balance_date
+                    )
+                self.save_checkpoint(account_statement, chunk, result, balance, balance_date)
+            # keys of committed transactions are found in the database
+            existing_keys.clear()
+        with db_transaction.atomic(using=db):
+            self.complete(account_statement, result)
+            if account_statement.incomplete:
+                account_statement.incomplete = False
+                account_statement.save(update_fields=["incomplete"])
+            self.import_run.checkpoint = None
+        self.observe(
+            result.save_duration - save_duration,
+            result.new_count - new_count,
+            result.duplicate_count - duplicate_count,
+        )
+
+    def chunk(self, batches: Iterable[List[Transaction]]) -> Iterable[List[List[Transaction]]]:
+        """Group batches into chunks of at least checkpoint_size transactions, which are committed together."""
+        chunk: List[List[Transaction]] = []
+        count = 0
+        for transactions in batches:
+            chunk.append(transactions)
+            count += len(transactions)
+            if count >= self.checkpoint_size:
+                yield chunk
+                chunk = []
+                count = 0
+        if chunk:
+            yield chunk
+
+    def save_checkpoint(
+        self,
+        account_statement: AccountStatement,
+        chunk: List[List[Transaction]],
+        result: IngestResult,
+        balance: Decimal | None,
+        balance_date: datetime.date | None,
+    ) -> None:
+        assert self.import_run is not None
+        checkpoint = self.import_run.checkpoint
+        member, skip = checkpoint["member"], checkpoint["skip"]
+        for transactions in chunk:
+            for transaction in transactions:
+                if transaction.source_member != member:
+                    member, skip = transaction.source_member, 0
+                skip += 1
+        self.save_dates(account_statement, result)
+        self.import_run.account_statement = account_statement
+        self.import_run.checkpoint = {
+            "member": member,
+            "offset": chunk[-1][-1].source_offset,
+            "skip": skip,
+            "count": result.count,
+            "new_count": result.new_count,
+            "duplicate_count": result.duplicate_count,
+            "amount": str(result.amount),
+            "balance": None if balance is None else str(balance),
+            "balance_date": None if balance_date is None else balance_date.isoformat(),
+        }
+        self.import_run.total_count = result.count
+        self.import_run.new_count = result.new_count
+        self.import_run.duplicate_count = result.duplicate_count
+        self.import_run.save()
+
+
+class ShardedPipeline(Pipeline):
+    """Pipeline reading a large statement file in parallel processes.
+
+    Files of shardable readers (GPC, BEST) are split into ranges of ``shard_size`` bytes starting
+    at record boundaries. The ranges are read by a pool of ``processes`` (all CPUs by default) and
+    their transactions are passed to the other stages in the order of the file. At most two ranges
+    per process are read ahead, so that a slow database still throttles reading. ZIP archives,
+    files without a path on disk and files of other readers are read as by ``Pipeline``.
+    The processes are started for each file (see ``bankreader.shards``).
+    """
+
+    shard_size = 16 * 1024 * 1024
+    processes: int | None = None
+
+    def __init__(
+        self,
+        account: Account,
+        batch_size: int | None = None,
+        queue_size: int | None = None,
+        processes: int | None = None,
+        shard_size: int | None = None,
+    ) -> None:
+        super().__init__(account, batch_size, queue_size)
+        if processes is not None:
+            self.processes = processes
+        if shard_size is not None:
+            self.shard_size = shard_size
+
+    def read(self, statement_file: IO) -> Iterable[Transaction]:
+        assert self.reader is not None
+        path = self.get_path(statement_file)
+        if path is None or not self.reader.shardable or is_zipfile(statement_file):
+            return super().read(statement_file)
+        transactions: Iterable[Transaction] = self.read_shards(path)
+        if self.reader.duplicate_key == FINGERPRINT:
+            transactions = self.reader.set_fingerprints(transactions)
+        return transactions
+
+    def get_path(self, statement_file: IO) -> str | None:
+        """Return path of the statement file, which the processes open themselves."""
+        if hasattr(statement_file, "temporary_file_path"):
+            return statement_file.temporary_file_path()
+        # names of other file objects (e.g. uploaded files kept in memory) are not paths
+        if isinstance(statement_file, (io.BufferedReader, io.FileIO)) and isinstance(statement_file.name, str):
+            return statement_file.name
+        return None
+
+    def read_shards(self, path: str) -> Iterable[Transaction]:
+        assert self.reader is not None
+        reader = "%s.%s" % (type(self.reader).__module__, type(self.reader).__name__)
+        start = time.monotonic()
+        with open(path, "rb") as statement_file:
+            ranges = self.reader.get_shards(statement_file, self.shard_size)
+        if not ranges:
+            return
+        processes = min(self.processes or os.cpu_count() or 1, len(ranges))
+        executor = ProcessPoolExecutor(
+            processes, mp_context=multiprocessing.get_context("spawn"), initializer=shards.setup
+        )
+        pending: Deque[Future] = deque()
+        try:
+            for shard_start, shard_end in ranges:
+                pending.append(executor.submit(shards.read_shard, self.reader, path, shard_start, shard_end))
+                if len(pending) >= 2 * processes:
+                    yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
+        finally:
+            executor.shutdown(cancel_futures=True)
+        metrics.inc("bankreader_bytes_processed_total", ranges[-1][1], reader=reader)
+        metrics.observe("bankreader_parse_duration_seconds", time.monotonic() - start, reader=reader)
+
+
+class RoutedPipeline(Pipeline):
+    """Pipeline saving transactions of one account, which were read from a statement file by RoutingPipeline."""
+
+    def __init__(
+        self, account: Account, reader: BaseReader, transactions: List[Transaction], digest: str, size: int
+    ) -> None:
+        super().__init__(account)
+        self.reader = reader
+        self.key_field = reader.duplicate_key
+        self.transactions = transactions
+        self.digest = digest
+        self.size = size
+
+    def open(self, statement_file: IO) -> Tuple[str, int]:
+        return self.digest, self.size
+
+    def read_in_background(self, statement_file: IO, result: IngestResult) -> Iterator[List[Transaction]]:
+        yield from self.batch(self.transactions)
+
+
+class RoutingPipeline:
+    """Import statement file holding statements of several accounts, reading it only once.
+
+    Transactions are routed by their source account (taken from the statement headers) to accounts
+    with matching IBAN (see ``Account.get_source_keys``), which use the same reader, so that duplicates
+    are recognized by the duplicate key of their reader. Each account gets its own account statement
+    and import run. All the transactions are kept in memory until the file is read, and balances
+    are not read from the headers, running balances continue from the last transaction of each account.
+    """
+
+    def __init__(self, reader: BaseReader, accounts: Iterable[Account] | None = None) -> None:
+        self.reader = reader
+        self.accounts = list(accounts) if accounts is not None else list(Account.objects.exclude(iban=None))
+
+    def get_accounts(self) -> Dict[str, Account]:
+        """Return accounts using the reader by their normalized account numbers."""
+        accounts: Dict[str, Account] = {}
+        for account in self.accounts:
+            if type(account.get_reader()) is not type(self.reader):
+                continue
+            for key in account.get_source_keys():
+                if key in accounts and accounts[key].pk != account.pk:
+                    raise IngestError(
+                        gettext('Accounts "{}" and "{}" have the same account number.').format(accounts[key], account)
+                    )
+                accounts[key] = account
+        return accounts
+
+    def run(self, statement_file: IO, file_name: str) -> Dict[Account, IngestResult | IngestError]:
+        """Read the statement file and import transactions of each account, returning its result or error."""
+        if not self.reader.has_source_account:
+            raise IngestError(
+                gettext("Format {} doesn't identify accounts of the statements.").format(self.reader.label)
+            )
+        accounts = self.get_accounts()
+        digest, size = storage.store_statement(statement_file)
+        transactions_by_account: Dict[Account, List[Transaction]] = {}
+        unknown: Set[str] = set()
+        try:
+            for transaction in self.reader.read_file(statement_file):
+                account = accounts.get(normalize_account_number(transaction.source_account))
+                if account is None:
+                    unknown.add(transaction.source_account)
+                else:
+                    transactions_by_account.setdefault(account, []).append(transaction)
+        except Exception as e:
+            raise IngestError(gettext("Failed to read transaction data in format {}.").format(self.reader.label)) from e
+        unknown_keys = {normalize_account_number(source_account) for source_account in unknown}
+        # nothing is imported to accounts of other readers, whose duplicate keys may differ
+        other_accounts = sorted({str(account) for account in self.accounts if account.get_source_keys() & unknown_keys})
+        if other_accounts:
+            raise IngestError(
+                gettext("Accounts {} use another account statement format than {}.").format(
+                    ", ".join('"%s"' % account for account in other_accounts), self.reader.label
+                )
+            )
+        if unknown:
+            # nothing is imported, so that the file may be imported again once the accounts are added
+            raise IngestError(
+                gettext("No account matches account number {}.").format(
+                    ", ".join('"%s"' % source_account for source_account in sorted(unknown))
+                )
+            )
+        if not transactions_by_account:
+            raise IngestError(gettext("The account statement doesn't contain any transaction data."))
+        results: Dict[Account, IngestResult | IngestError] = {}
+        for account, transactions in transactions_by_account.items():
+            try:
+                results[account] = RoutedPipeline(account, self.reader, transactions, digest, size).run(
+                    statement_file, file_name
+                )
+            except IngestError as e:
+                results[account] = e
+        return results
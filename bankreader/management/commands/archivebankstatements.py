@@ -0,0 +1,100 @@
+import datetime
+import gzip
+import os
+from itertools import chain
+from typing import Any, List
+
+from django.core import serializers
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.db import router, transaction as db_transaction
+from django.db.models import Q
+from django.db.models.deletion import Collector
+
+from ...models import Account, AccountStatement, ArchivedTransaction, Transaction
+
+
+class Command(BaseCommand):
+    help = (
+        "Move account statements older than the given date to compressed archive files. "
+        "Keys of archived transactions are kept, so that they are still recognized as duplicates. "
+        "Account statements with other objects linked to their transactions (e.g. payments) are skipped."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("--before", dest="before", type=datetime.date.fromisoformat, required=True)
+        parser.add_argument("--account", dest="account", type=str)
+        parser.add_argument("--output-dir", dest="output_dir", type=str, required=True)
+        parser.add_argument("--dry-run", dest="dry_run", action="store_true")
+
+    def handle(self, **options: Any) -> None:
+        account_statements = AccountStatement.objects.filter(to_date__lt=options["before"]).select_related("account")
+        if options["account"]:
+            try:
+                q = Q(pk=int(options["account"]))
+            except ValueError:
+                q = Q(name=options["account"]) | Q(iban=options["account"])
+            try:
+                account = Account.objects.get(q)
+            except Account.DoesNotExist:
+                raise CommandError('Account "%s" does not exist' % options["account"])
+            except Account.MultipleObjectsReturned:
+                raise CommandError('Account "%s" is ambiguous' % options["account"])
+            account_statements = account_statements.filter(account=account)
+
+        for account_statement in account_statements.order_by("account_id", "from_date").iterator():
+            archive = os.path.join(
+                options["output_dir"],
+                str(account_statement.account_id),
+                "%d.json.gz" % account_statement.id,
+            )
+            related = self.get_related_models(account_statement)
+            if related:
+                self.stderr.write(
+                    self.style.WARNING(
+                        'Skipping account statement "%s" linked to objects of %s, which would be deleted'
+                        % (account_statement, ", ".join(related))
+                    )
+                )
+                continue
+            count = account_statement.transactions.count()
+            self.stdout.write(
+                self.style.HTTP_INFO(
+                    'Archiving account statement "%s" (%d transactions) to %s' % (account_statement, count, archive)
+                )
+            )
+            if options["dry_run"]:
+                continue
+            self.archive_account_statement(account_statement, archive)
+
+    def get_related_models(self, account_statement: AccountStatement) -> List[str]:
+        """Return labels of models with objects, which would be deleted with the statement but are not archived."""
+        collector = Collector(using=router.db_for_write(AccountStatement, instance=account_statement))
+        collector.collect([account_statement])
+        related = {model._meta.label for model, objects in collector.data.items() if objects}
+        related.update(queryset.model._meta.label for queryset in collector.fast_deletes if queryset.exists())
+        return sorted(related - {AccountStatement._meta.label, Transaction._meta.label})
+
+    @db_transaction.atomic
+    def archive_account_statement(self, account_statement: AccountStatement, archive: str) -> None:
+        transactions = account_statement.transactions.order_by("id")
+        os.makedirs(os.path.dirname(archive), exist_ok=True)
+        with gzip.open(archive, "wt", encoding="utf-8") as f:
+            # the archive is a regular fixture and may be restored using loaddata
+            serializers.serialize("json", chain([account_statement], transactions.iterator()), stream=f)
+        ArchivedTransaction.objects.bulk_create(
+            (
+                ArchivedTransaction(
+                    account_id=account_statement.account_id,
+                    transaction_id=transaction_id,
+                    accounted_date=accounted_date,
+                    fingerprint=fingerprint,
+                    archive=archive,
+                )
+                for transaction_id, accounted_date, fingerprint in transactions.values_list(
+                    "transaction_id", "accounted_date", "fingerprint"
+                )
+            ),
+            batch_size=1000,
+            ignore_conflicts=True,
+        )
+        account_statement.delete()
@@ -0,0 +1,56 @@
+import datetime
+import time
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandParser
+from django.db import close_old_connections, router
+
+from ...models import IngestJob
+from ...worker import claim_job, get_worker_name, run_job
+
+
+class Command(BaseCommand):
+    help = "Import queued account statements, any number of workers may run at once"
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("--once", dest="once", action="store_true", help="Exit when there are no jobs available.")
+        parser.add_argument("--sleep", dest="sleep", type=float, default=5.0, help="Seconds between polls.")
+        parser.add_argument(
+            "--lease",
+            dest="lease",
+            type=int,
+            default=600,
+            help="Seconds after which a job of a stuck worker is run again, running jobs renew it periodically.",
+        )
+        parser.add_argument("--max-jobs", dest="max_jobs", type=int, help="Exit after running this many jobs.")
+
+    def handle(self, **options: Any) -> None:
+        worker = get_worker_name()
+        lease = datetime.timedelta(seconds=options["lease"])
+        jobs_count = 0
+        self.stdout.write(self.style.HTTP_INFO('Worker "%s" started' % worker))
+        while options["max_jobs"] is None or jobs_count < options["max_jobs"]:
+            close_old_connections()
+            job = claim_job(worker, lease)
+            if job is None:
+                if options["once"]:
+                    break
+                time.sleep(options["sleep"])
+                continue
+            jobs_count += 1
+            self.stdout.write(
+                self.style.HTTP_INFO('Loading bank statement "%s" for account "%s"' % (job.file_name, job.account))
+            )
+            result = run_job(job, worker, lease)
+            # the outcome was just written to the primary database
+            job.refresh_from_db(using=router.db_for_write(IngestJob))
+            if result is not None:
+                self.stdout.write(self.style.HTTP_INFO("%s: %s" % (job.file_name, result)))
+            elif job.status == IngestJob.PENDING:
+                self.stderr.write(
+                    self.style.WARNING('Error loading bank statement "%s", will retry: %s' % (job.file_name, job.error))
+                )
+            else:
+                self.stderr.write(
+                    self.style.ERROR('Error loading bank statement "%s": %s' % (job.file_name, job.error))
+                )
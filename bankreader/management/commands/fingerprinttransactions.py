@@ -0,0 +1,51 @@
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.db import router, transaction as db_transaction
+from django.db.models import Q
+
+from ...fingerprints import fill_fingerprints
+from ...models import Account, ArchivedTransaction, Transaction, bump_data_version
+from ...readers.base import FINGERPRINT
+
+
+class Command(BaseCommand):
+    help = (
+        "Compute missing fingerprints of already imported transactions of accounts, "
+        "whose readers recognize duplicate transactions by fingerprints."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("--account", dest="accounts", action="append", help="Account id or name, defaults to all.")
+
+    def handle(self, **options: Any) -> None:
+        accounts = Account.objects.exclude(reader=None).order_by("pk")
+        if options["accounts"]:
+            q = Q()
+            for account in options["accounts"]:
+                try:
+                    q |= Q(pk=int(account))
+                except ValueError:
+                    q |= Q(name=account)
+            accounts = accounts.filter(q)
+            if not accounts:
+                raise CommandError("No account matches %s" % ", ".join(options["accounts"]))
+        for account in accounts:
+            reader = account.get_reader()
+            if reader is None or reader.duplicate_key != FINGERPRINT:
+                continue
+            using = router.db_for_write(Transaction, instance=account)
+            with db_transaction.atomic(using=using):
+                account.lock()
+                filled, conflicts = fill_fingerprints(reader, account.pk, Transaction, ArchivedTransaction, using)
+                if filled:
+                    # missing transaction ids were replaced by the fingerprints
+                    bump_data_version(using=using)
+            self.stdout.write(self.style.HTTP_INFO("%s: filled %d fingerprints." % (account, filled)))
+            if conflicts:
+                self.stdout.write(
+                    self.style.WARNING(
+                        "%s: %d transactions are equal to other transactions and keep their transaction ids."
+                        % (account, conflicts)
+                    )
+                )
@@ -1,12 +1,17 @@
 import os
 import traceback
-from typing import Any
+from typing import Any, Dict, List
 
 from django.conf import settings
 from django.core.management.base import BaseCommand, CommandParser
 from django.db.models import Q
 
-from ...models import Account, AccountStatement
+from ...ingest import IngestError, Pipeline, ResumablePipeline, RoutingPipeline, ShardedPipeline
+from ...models import Account
+from ...preview import StatementPreview
+from ...readers import readers
+from ...readers.base import BaseReader
+from ...worker import enqueue_file
 
 
 class Command(BaseCommand):
@@ -14,9 +19,58 @@ class Command(BaseCommand):
 
     def add_arguments(self, parser: CommandParser) -> None:
         parser.add_argument("--account", dest="account", type=str)
+        parser.add_argument(
+            "--dry-run",
+            dest="dry_run",
+            action="store_true",
+            help="Only read the statements and report what would be loaded.",
+        )
+        parser.add_argument(
+            "--queue",
+            dest="queue",
+            action="store_true",
+            help="Only queue the statements to be loaded by bankreaderworker.",
+        )
+        parser.add_argument(
+            "--resumable",
+            dest="resumable",
+            action="store_true",
+            help="Commit transactions in chunks, running the command again continues an interrupted import.",
+        )
+        parser.add_argument(
+            "--processes",
+            dest="processes",
+            type=int,
+            help="Read each GPC or BEST file in parallel using given number of processes (0 for all CPUs).",
+        )
+        parser.add_argument(
+            "--route",
+            dest="route",
+            action="store_true",
+            help="Import transactions to the accounts given by the statement headers (GPC, MT940), "
+            "reading each file only once. The format is given by --reader or by the format of --account.",
+        )
+        parser.add_argument("--reader", dest="reader", type=str, help="Account statement format of routed files.")
         parser.add_argument("input_file", nargs="+", type=str)
 
     def handle(self, **options: Any) -> None:
+        if options["route"] and (options["dry_run"] or options["queue"]):
+            self.stderr.write(self.style.ERROR("Routed files can not be loaded with --dry-run or --queue"))
+            return
+        if options["resumable"] and options["processes"] is not None:
+            self.stderr.write(self.style.ERROR("Files can not be loaded with both --resumable and --processes"))
+            return
+        if options["route"] and options["reader"]:
+            reader = readers.get(options["reader"])
+            if reader is None:
+                self.stderr.write(self.style.ERROR('Account statement format "%s" does not exist' % options["reader"]))
+                return
+            self.route(reader, options["input_file"])
+            return
+        if options["account"] is None:
+            self.stderr.write(self.style.ERROR("Account is required, use --account"))
+            return
+
         # get account
         try:
             q = Q(pk=int(options["account"]))
@@ -35,30 +89,78 @@ class Command(BaseCommand):
         reader = account.get_reader()
         assert reader is not None
 
+        if options["route"]:
+            self.route(reader, options["input_file"])
+            return
+
         for input_file in options["input_file"]:
+            if options["queue"]:
+                job = enqueue_file(account, input_file)
+                self.stdout.write(self.style.HTTP_INFO('Queued bank statement "%s" as job %d' % (input_file, job.pk)))
+                continue
             self.stdout.write(
                 self.style.HTTP_INFO('Loading bank statement "%s" for account "%s"' % (input_file, account))
             )
+            if options["dry_run"]:
+                try:
+                    with open(input_file, "rb") as f:
+                        preview = StatementPreview(account).read(reader, f)
+                except Exception as e:
+                    if settings.DEBUG:
+                        traceback.print_exc()
+                    self.stderr.write(self.style.ERROR('Error reading bank statement "%s": %s' % (input_file, e)))
+                else:
+                    self.stdout.write(self.style.HTTP_INFO("%s: %s" % (input_file, preview)))
+                continue
             try:
                 with open(input_file, "rb") as f:
-                    transactions = tuple(reader.read_file(f))
+                    pipeline = self.get_pipeline(account, options)
+                    result = pipeline.run(f, os.path.basename(input_file))
             except Exception as e:
                 if settings.DEBUG:
                     traceback.print_exc()
                 self.stderr.write(self.style.ERROR('Error loading bank statement "%s": %s' % (input_file, e)))
                 continue
-            if not transactions:
-                self.stderr.write(
-                    self.style.ERROR('The account statement "%s" doesn\'t contain any transaction data.' % input_file)
-                )
-                continue
-            statement = AccountStatement(account=account, statement=os.path.basename(input_file))
-            messages = statement.save_with_transactions(transactions)
-            for message in messages:
+            for message in result.messages:
                 self.stderr.write(self.style.WARNING(message))
             self.stdout.write(
                 self.style.HTTP_INFO(
                     "Successfully loaded %d transactions (%d new) from %s."
-                    % (len(transactions), len(transactions) - len(messages), input_file)
+                    % (result.count, result.new_count, input_file)
                 )
             )
+
+    def get_pipeline(self, account: Account, options: Dict[str, Any]) -> Pipeline:
+        if options["resumable"]:
+            return ResumablePipeline(account)
+        if options["processes"] is not None:
+            return ShardedPipeline(account, processes=options["processes"] or None)
+        return Pipeline(account)
+
+    def route(self, reader: BaseReader, input_files: List[str]) -> None:
+        for input_file in input_files:
+            self.stdout.write(self.style.HTTP_INFO('Loading bank statement "%s" for all accounts' % input_file))
+            try:
+                with open(input_file, "rb") as f:
+                    results = RoutingPipeline(reader).run(f, os.path.basename(input_file))
+            except Exception as e:
+                if settings.DEBUG:
+                    traceback.print_exc()
+                self.stderr.write(self.style.ERROR('Error loading bank statement "%s": %s' % (input_file, e)))
+                continue
+            for account, result in results.items():
+                if isinstance(result, IngestError):
+                    self.stderr.write(
+                        self.style.ERROR(
+                            'Error loading bank statement "%s" for account "%s": %s' % (input_file, account, result)
+                        )
+                    )
+                    continue
+                for message in result.messages:
+                    self.stderr.write(self.style.WARNING(message))
+                self.stdout.write(
+                    self.style.HTTP_INFO(
+                        'Successfully loaded %d transactions (%d new) from %s for account "%s".'
+                        % (result.count, result.new_count, input_file, account)
+                    )
+                )
@@ -0,0 +1,139 @@
+import gc
+import io
+import os
+import tracemalloc
+from typing import Any, Iterable, List, Tuple
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.db import transaction as db_transaction
+
+from ...models import Account, AccountStatement
+from ...readers import readers
+from ...readers.base import BaseReader
+from ...samples import generate, wrap_in_zip
+
+MB = 1024 * 1024
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure peak and retained memory of reading account statements (and saving them, if account is given) "
+        "using generated or given statement files."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("--reader", dest="readers", action="append", help="Reader key, defaults to all readers.")
+        parser.add_argument("--rows", dest="rows", type=int, default=10000, help="Rows of generated files.")
+        parser.add_argument(
+            "--zip-depth", dest="zip_depths", type=int, nargs="+", default=[0], help="Levels of nested ZIP archives."
+        )
+        parser.add_argument(
+            "--account", dest="account", type=str, help="Also save the transactions to this account (rolled back)."
+        )
+        parser.add_argument("--top", dest="top", type=int, default=10, help="Number of top allocating lines shown.")
+        parser.add_argument(
+            "--max-peak-per-mb", dest="max_peak_per_mb", type=float, help="Budget of peak MB per MB of input."
+        )
+        parser.add_argument(
+            "--max-retained-per-mb",
+            dest="max_retained_per_mb",
+            type=float,
+            help="Budget of retained MB per MB of input.",
+        )
+        parser.add_argument("input_file", nargs="*", type=str, help="Statement files used instead of generated ones.")
+
+    def handle(self, **options: Any) -> None:
+        selected_readers = {key: readers[key] for key in options["readers"] or readers if key in readers}
+        if options["readers"] and len(selected_readers) != len(options["readers"]):
+            raise CommandError("Unknown reader: %s" % ", ".join(set(options["readers"]) - set(selected_readers)))
+        if options["input_file"] and len(selected_readers) != 1:
+            raise CommandError("Exactly one reader must be selected to read given files.")
+        account = None
+        if options["account"]:
+            try:
+                account = Account.objects.get(pk=options["account"])
+            except (Account.DoesNotExist, ValueError):
+                raise CommandError('Account "%s" does not exist' % options["account"])
+
+        if account is not None and settings.DEBUG:
+            self.stderr.write(self.style.WARNING("Logging of database queries with DEBUG enabled is included."))
+
+        failures = []
+        for key, reader in selected_readers.items():
+            for name, data in self.get_samples(reader, options):
+                for depth in options["zip_depths"]:
+                    label = "%s %s zip-depth=%d" % (key, name, depth)
+                    peak, retained = self.profile(label, reader, data, depth, account, options["top"])
+                    size = len(data) / MB
+                    if not size:
+                        # memory per MB of an empty input is not defined
+                        continue
+                    if options["max_peak_per_mb"] is not None and peak / MB / size > options["max_peak_per_mb"]:
+                        failures.append("%s: peak %.1f MB per MB of input" % (label, peak / MB / size))
+                    if (
+                        options["max_retained_per_mb"] is not None
+                        and retained / MB / size > options["max_retained_per_mb"]
+                    ):
+                        failures.append("%s: retained %.1f MB per MB of input" % (label, retained / MB / size))
+        if failures:
+            raise CommandError("Memory budget exceeded:\n%s" % "\n".join(failures))
+
+    def get_samples(self, reader: BaseReader, options: dict) -> Iterable[Tuple[str, bytes]]:
+        if options["input_file"]:
+            for input_file in options["input_file"]:
+                with open(input_file, "rb") as f:
+                    yield os.path.basename(input_file), f.read()
+            return
+        try:
+            yield "generated-%d" % options["rows"], generate(reader, options["rows"])
+        except NotImplementedError as e:
+            self.stderr.write(self.style.WARNING(str(e)))
+
+    def profile(
+        self, label: str, reader: BaseReader, data: bytes, zip_depth: int, account: Account | None, top: int
+    ) -> Tuple[int, int]:
+        """Return peak and retained memory of reading (and saving) the data wrapped in ZIP archives."""
+        was_tracing = tracemalloc.is_tracing()
+        if not was_tracing:
+            tracemalloc.start()
+        try:
+            statement_file = io.BytesIO(wrap_in_zip(data, "statement", zip_depth))
+            baseline = tracemalloc.take_snapshot()
+            tracemalloc.reset_peak()
+            start_size = tracemalloc.get_traced_memory()[0]
+            transactions = tuple(reader.read_file(statement_file))
+            if account is not None and transactions:
+                with db_transaction.atomic():
+                    AccountStatement(account=account, statement=label).save_with_transactions(transactions)
+                    db_transaction.set_rollback(True)
+            count = len(transactions)
+            # retained memory is what remains after the transactions are released
+            del transactions
+            gc.collect()
+            size, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot()
+        finally:
+            if not was_tracing:
+                tracemalloc.stop()
+        peak -= start_size
+        retained = size - start_size
+        self.stdout.write(
+            self.style.HTTP_INFO(
+                "%s: %d transactions, input %.2f MB, peak %.2f MB, retained %.2f MB, peak per MB of input %s"
+                % (
+                    label,
+                    count,
+                    len(data) / MB,
+                    peak / MB,
+                    retained / MB,
+                    "%.1f" % (peak / len(data)) if data else "n/a",
+                )
+            )
+        )
+        statistics: List[tracemalloc.StatisticDiff] = snapshot.filter_traces(
+            [tracemalloc.Filter(False, tracemalloc.__file__)]
+        ).compare_to(baseline, "lineno")
+        for statistic in statistics[:top]:
+            self.stdout.write("    %s" % statistic)
+        return peak, retained
@@ -0,0 +1,249 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+from typing import Any, Dict, List, Set, Tuple
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.db import router, transaction as db_transaction
+from django.db.models import F
+
+from ... import date_index, search, shards, storage
+from ...models import AccountStatement, Transaction, bump_data_version
+from ...readers import readers
+from ...readers.base import FINGERPRINT, TRANSACTION_ID
+
+# fields updated in place, transactions are matched by the duplicate key of the reader
+FIELDS = (
+    "entry_date",
+    "accounted_date",
+    "remote_account_number",
+    "remote_account_name",
+    "amount",
+    "variable_symbol",
+    "constant_symbol",
+    "specific_symbol",
+    "sender_description",
+    "recipient_description",
+)
+# fields identifying the transactions
+KEY_FIELDS = (TRANSACTION_ID, FINGERPRINT)
+BATCH_SIZE = 500
+
+
+def has_transaction_id(values: Any) -> bool:
+    """Return whether the transaction (or its values) has an id of its own, not replaced by its fingerprint."""
+    if isinstance(values, dict):
+        return values[TRANSACTION_ID] != values[FINGERPRINT]
+    return values.transaction_id != values.fingerprint
+
+
+class Command(BaseCommand):
+    help = (
+        "Read stored account statement files again using current readers "
+        "and update changed fields of existing transactions in place."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("--account", dest="account", type=int, help="Only reparse statements of this account.")
+        parser.add_argument("--processes", dest="processes", type=int, help="Number of parsing processes.")
+        parser.add_argument("--dry-run", dest="dry_run", action="store_true", help="Only report what would be updated.")
+        parser.add_argument("statement", nargs="*", type=int, help="Account statement ids, defaults to all.")
+
+    def handle(self, **options: Any) -> None:
+        if storage.get_store_dir() is None:
+            raise CommandError("Setting BANKREADER_STATEMENT_STORE is not configured.")
+        statements = AccountStatement.objects.select_related("account").exclude(digest="").order_by("pk")
+        if options["account"]:
+            statements = statements.filter(account_id=options["account"])
+        if options["statement"]:
+            statements = statements.filter(pk__in=options["statement"])
+        jobs: List[Tuple[AccountStatement, str]] = []
+        for statement in statements:
+            reader_key = statement.account.reader
+            if reader_key not in readers:
+                self.stderr.write(self.style.WARNING('Unknown reader of account statement "%s".' % statement))
+            elif not storage.has_statement(statement.digest):
+                self.stderr.write(self.style.WARNING('File of account statement "%s" is not stored.' % statement))
+            else:
+                jobs.append((statement, reader_key))
+
+        fields = list(FIELDS + KEY_FIELDS)
+        # spawned processes share neither threads nor database connections with this one
+        with ProcessPoolExecutor(
+            options["processes"], mp_context=multiprocessing.get_context("spawn"), initializer=shards.setup
+        ) as executor:
+            futures = [
+                executor.submit(shards.parse_statement, type(readers[reader_key]), statement.digest, fields)
+                for statement, reader_key in jobs
+            ]
+            for (statement, _), future in zip(jobs, futures):
+                try:
+                    values = future.result()
+                except Exception as e:
+                    self.stderr.write(self.style.ERROR('Error reading account statement "%s": %s' % (statement, e)))
+                    continue
+                self.update_statement(statement, values, options["dry_run"])
+
+    def update_statement(self, statement: AccountStatement, parsed: List[Dict[str, Any]], dry_run: bool) -> None:
+        key_field = statement.account.get_duplicate_key()
+        fields = FIELDS + ((FINGERPRINT,) if key_field == FINGERPRINT else ())
+        changed: List[Transaction] = []
+        changed_fields = set()
+        dates_changed = False
+        with db_transaction.atomic(using=router.db_for_write(Transaction)):
+            transactions = list(statement.transactions.select_for_update().order_by("pk"))
+            old_amounts = {transaction.pk: transaction.amount for transaction in transactions}
+            matched = self.match_transactions(transactions, parsed, key_field)
+            matched_pks = {transaction.pk for transaction in matched.values()}
+            for transaction in transactions:
+                if transaction.pk not in matched_pks:
+                    self.stderr.write(
+                        self.style.WARNING(
+                            'Transaction "%s" is missing in account statement "%s".'
+                            % (transaction.transaction_id, statement)
+                        )
+                    )
+            taken = (
+                self.get_taken_fingerprints(statement, transactions, parsed, matched)
+                if FINGERPRINT in fields
+                else set()
+            )
+            for index, transaction in matched.items():
+                new_values = dict(parsed[index])
+                if key_field == FINGERPRINT and not has_transaction_id(transaction):
+                    # the fingerprint replaces the missing transaction id
+                    new_values[TRANSACTION_ID] = new_values[FINGERPRINT]
+                    transaction_fields = fields + (TRANSACTION_ID,)
+                else:
+                    transaction_fields = fields
+                if new_values[FINGERPRINT] in taken and new_values[FINGERPRINT] != transaction.fingerprint:
+                    self.stderr.write(
+                        self.style.WARNING(
+                            'Transaction "%s" of account statement "%s" keeps its fingerprint, '
+                            "the new one belongs to another transaction." % (transaction.transaction_id, statement)
+                        )
+                    )
+                    transaction_fields = FIELDS
+                changed_here = [
+                    field for field in transaction_fields if getattr(transaction, field) != new_values[field]
+                ]
+                if changed_here:
+                    for field in changed_here:
+                        setattr(transaction, field, new_values[field])
+                    changed.append(transaction)
+                    changed_fields.update(changed_here)
+                    dates_changed = dates_changed or "accounted_date" in changed_here
+            if "amount" in changed_fields:
+                changed.extend(self.update_balances(statement, transactions, old_amounts, parsed, matched, dry_run))
+                changed_fields.add("balance")
+                changed = list({transaction.pk: transaction for transaction in changed}.values())
+            if changed and not dry_run:
+                Transaction.objects.bulk_update(changed, sorted(changed_fields), batch_size=BATCH_SIZE)
+                search.index_transactions(changed, using=statement._state.db or "default")
+                if dates_changed:
+                    db_transaction.on_commit(lambda: date_index.invalidate(statement.account_id))
+                # bulk updates send no signals
+                bump_data_version(using=statement._state.db or "default")
+        if len(parsed) > len(matched):
+            self.stderr.write(
+                self.style.WARNING(
+                    'Account statement "%s" contains %d transactions, which were not imported with it.'
+                    % (statement, len(parsed) - len(matched))
+                )
+            )
+        self.stdout.write(
+            self.style.HTTP_INFO(
+                '%s %d transactions (%s) of account statement "%s".'
+                % (
+                    "Would update" if dry_run else "Updated",
+                    len(changed),
+                    ", ".join(sorted(changed_fields)) or "no changes",
+                    statement,
+                )
+            )
+        )
+
+    def match_transactions(
+        self, transactions: List[Transaction], parsed: List[Dict[str, Any]], key_field: str
+    ) -> Dict[int, Transaction]:
+        """Return stored transactions by index of the parsed transaction they were imported from.
+
+        Transactions are matched by their duplicate key. Fingerprints change with the fixed fields, so transactions
+        of readers using them are matched by their own transaction ids, then by unchanged fingerprints and
+        the remaining ones by their order in the statement.
+        """
+        matched: Dict[int, Transaction] = {}
+        remaining = list(range(len(parsed)))
+        unmatched = transactions
+        for field in (TRANSACTION_ID, FINGERPRINT) if key_field == FINGERPRINT else (TRANSACTION_ID,):
+            by_key: Dict[str, int] = {}
+            for index in remaining:
+                if field == FINGERPRINT or key_field == TRANSACTION_ID or has_transaction_id(parsed[index]):
+                    # repeated keys were imported only once, as duplicates of the first one
+                    by_key.setdefault(parsed[index][field], index)
+            transactions, unmatched = unmatched, []
+            for transaction in transactions:
+                key = getattr(transaction, field)
+                if key in by_key:
+                    matched[by_key.pop(key)] = transaction
+                else:
+                    unmatched.append(transaction)
+            remaining = [index for index in remaining if index not in matched]
+        if key_field == FINGERPRINT and unmatched and len(unmatched) == len(remaining):
+            matched.update(zip(remaining, unmatched))
+        return matched
+
+    def get_taken_fingerprints(
+        self,
+        statement: AccountStatement,
+        transactions: List[Transaction],
+        parsed: List[Dict[str, Any]],
+        matched: Dict[int, Transaction],
+    ) -> Set[str]:
+        """Return new fingerprints, which already belong to transactions of the account outside the statement."""
+        fingerprints = {parsed[index][FINGERPRINT] for index in matched}
+        own = {transaction.fingerprint for transaction in transactions}
+        return statement.account.get_existing_keys(fingerprints - own, FINGERPRINT)
+
+    def update_balances(
+        self,
+        statement: AccountStatement,
+        transactions: List[Transaction],
+        old_amounts: Dict[int, Decimal],
+        parsed: List[Dict[str, Any]],
+        matched: Dict[int, Transaction],
+        dry_run: bool,
+    ) -> List[Transaction]:
+        """Recompute running balances after amounts changed and return transactions of the statement with them.
+
+        Balances starting from the opening balance of the statement run through all transactions of the file
+        (as on import), balances continuing from the previous transaction of the account are shifted by the
+        changes of amounts. Balances of later statements continuing from this one are shifted by the total change.
+        """
+        changed = []
+        if statement.opening_balance is not None:
+            balance = statement.opening_balance
+            for index, values in enumerate(parsed):
+                balance += values["amount"]
+                transaction = matched.get(index)
+                if transaction is not None and transaction.balance is not None and transaction.balance != balance:
+                    transaction.balance = balance
+                    changed.append(transaction)
+        else:
+            shift = Decimal(0)
+            for transaction in sorted(
+                transactions, key=lambda transaction: (transaction.accounted_date, transaction.pk)
+            ):
+                shift += transaction.amount - old_amounts[transaction.pk]
+                if transaction.balance is not None and shift:
+                    transaction.balance += shift
+                    changed.append(transaction)
+        total_shift = sum(transaction.amount - old_amounts[transaction.pk] for transaction in transactions)
+        if total_shift and transactions and not dry_run:
+            Transaction.objects.filter(
+                account_id=statement.account_id,
+                account_statement__opening_balance__isnull=True,
+                balance__isnull=False,
+                pk__gt=transactions[-1].pk,
+            ).exclude(account_statement=statement).update(balance=F("balance") + total_shift)
+        return changed
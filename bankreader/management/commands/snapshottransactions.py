@@ -0,0 +1,53 @@
+import datetime
+import time
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.db.models import Q
+
+from ...models import Account
+from ...snapshot import SnapshotError, write_snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        "Write transactions into a columnar NumPy snapshot (.npz) for analytics, "
+        "an existing snapshot is updated with transactions of newly imported account statements."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("--account", dest="accounts", action="append", help="Account id or name, defaults to all.")
+        parser.add_argument("--date-from", dest="date_from", type=datetime.date.fromisoformat)
+        parser.add_argument("--date-to", dest="date_to", type=datetime.date.fromisoformat)
+        parser.add_argument("--full", dest="full", action="store_true", help="Rebuild the snapshot from scratch.")
+        parser.add_argument("--compress", dest="compress", action="store_true", help="Compress the arrays.")
+        parser.add_argument("output_file", type=str)
+
+    def handle(self, **options: Any) -> None:
+        account_ids = []
+        for account in options["accounts"] or []:
+            try:
+                q = Q(pk=int(account))
+            except ValueError:
+                q = Q(name=account)
+            try:
+                account_ids.append(Account.objects.get(q).pk)
+            except Account.DoesNotExist:
+                raise CommandError('Account "%s" does not exist' % account)
+        start = time.monotonic()
+        try:
+            count = write_snapshot(
+                options["output_file"],
+                account_ids,
+                options["date_from"],
+                options["date_to"],
+                full=options["full"],
+                compress=options["compress"],
+            )
+        except SnapshotError as e:
+            raise CommandError(str(e))
+        self.stdout.write(
+            self.style.HTTP_INFO(
+                "Added %d transactions to %s in %.3f s." % (count, options["output_file"], time.monotonic() - start)
+            )
+        )
@@ -0,0 +1,238 @@
+"""
+Import and reader metrics in the Prometheus text exposition format.
+
+Metrics are collected in every process. If ``settings.BANKREADER_METRICS_DIR`` is set,
+each process also stores its metrics in that directory (at most once per ``DUMP_INTERVAL``
+seconds and at exit) and the exposition aggregates metrics of all processes, which is needed
+with multi-process application servers. Metrics of processes which are no longer running
+(on the same host) are merged into a single file, so that their counters are kept.
+"""
+
+import atexit
+import importlib.util
+import json
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from typing import Dict, Iterable, List, Tuple
+
+from django.conf import settings
+
+# merging of finished processes' metrics requires file locks
+HAS_FCNTL = importlib.util.find_spec("fcntl") is not None
+if HAS_FCNTL:
+    import fcntl
+
+Labels = Tuple[Tuple[str, str], ...]
+
+BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, float("inf"))
+
+COUNTERS = {
+    "bankreader_transactions_imported_total": "Number of imported transactions.",
+    "bankreader_transactions_duplicate_total": "Number of transactions rejected as duplicates.",
+    "bankreader_bytes_processed_total": "Number of bytes of account statement files read.",
+    "bankreader_zip_members_total": "Number of ZIP archive members expanded.",
+}
+
+HISTOGRAMS = {
+    "bankreader_parse_duration_seconds": "Time spent reading account statement files.",
+    "bankreader_persist_duration_seconds": "Time spent saving account statements with transactions.",
+}
+
+_lock = threading.Lock()
+_counters: Dict[Tuple[str, Labels], float] = defaultdict(float)
+# bucket counts followed by the sum and the count of observations
+_histograms: Dict[Tuple[str, Labels], List[float]] = {}
+_pid: int | None = None
+_dump_file_name = ""
+_dumped_at = 0.0
+
+DUMP_INTERVAL = 1.0
+# metrics of finished processes
+DEAD_FILE_NAME = "dead.json"
+
+
+def _check_pid() -> None:
+    """Start with empty metrics in a forked process and never reuse metrics file of another process."""
+    global _pid, _dump_file_name
+    if _pid != os.getpid():
+        _pid = os.getpid()
+        _dump_file_name = "%d-%s.json" % (_pid, uuid.uuid4().hex)
+        _counters.clear()
+        _histograms.clear()
+        # the parent may have dumped its metrics just before forking
+        global _dumped_at
+        _dumped_at = 0.0
+
+
+def inc(name: str, value: float = 1, **labels: str) -> None:
+    with _lock:
+        _check_pid()
+        _counters[name, tuple(sorted(labels.items()))] += value
+    _dump()
+
+
+def observe(name: str, value: float, **labels: str) -> None:
+    with _lock:
+        _check_pid()
+        histogram = _histograms.setdefault((name, tuple(sorted(labels.items()))), [0.0] * (len(BUCKETS) + 2))
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                histogram[i] += 1
+        histogram[-2] += value
+        histogram[-1] += 1
+    _dump()
+
+
+def _get_metrics_dir() -> str | None:
+    return getattr(settings, "BANKREADER_METRICS_DIR", None)
+
+
+def _dump(force: bool = False) -> None:
+    global _dumped_at
+    metrics_dir = _get_metrics_dir()
+    if not metrics_dir:
+        return
+    with _lock:
+        _check_pid()
+        now = time.monotonic()
+        if not force and now - _dumped_at < DUMP_INTERVAL:
+            return
+        _dumped_at = now
+        path = os.path.join(metrics_dir, _dump_file_name)
+        data = {
+            "counters": [[name, labels, value] for (name, labels), value in _counters.items()],
+            "histograms": [[name, labels, values] for (name, labels), values in _histograms.items()],
+        }
+    _write(path, data)
+
+
+def _dump_at_exit() -> None:
+    # only processes which collected any metrics have anything to keep
+    if _pid == os.getpid() and (_counters or _histograms):
+        _dump(force=True)
+
+
+atexit.register(_dump_at_exit)
+
+
+def _write(path: str, data: Dict) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = "%s.%s.tmp" % (path, uuid.uuid4().hex)
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def _read(path: str) -> Dict:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"counters": [], "histograms": []}
+
+
+def _is_running(file_name: str) -> bool:
+    try:
+        os.kill(int(file_name.split("-", 1)[0]), 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, ValueError):
+        pass
+    return True
+
+
+def _merge(
+    data: Dict, counters: Dict[Tuple[str, Labels], float], histograms: Dict[Tuple[str, Labels], List[float]]
+) -> None:
+    for name, labels, value in data["counters"]:
+        counters[name, tuple(map(tuple, labels))] += value
+    for name, labels, values in data["histograms"]:
+        histogram = histograms.setdefault((name, tuple(map(tuple, labels))), [0.0] * len(values))
+        for i, value in enumerate(values):
+            histogram[i] += value
+
+
+def _merge_dead(metrics_dir: str) -> None:
+    """Merge metrics files of processes, which are no longer running, into the file of finished processes."""
+    dead = [
+        file_name
+        for file_name in os.listdir(metrics_dir)
+        if file_name.endswith(".json") and file_name != DEAD_FILE_NAME and not _is_running(file_name)
+    ]
+    if not dead:
+        return
+    with open(os.path.join(metrics_dir, "dead.lock"), "w") as lock_file:
+        # merging collectors would overwrite each other's results
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        counters: Dict[Tuple[str, Labels], float] = defaultdict(float)
+        histograms: Dict[Tuple[str, Labels], List[float]] = {}
+        dead_path = os.path.join(metrics_dir, DEAD_FILE_NAME)
+        _merge(_read(dead_path), counters, histograms)
+        merged = []
+        for file_name in dead:
+            path = os.path.join(metrics_dir, file_name)
+            if os.path.exists(path):
+                _merge(_read(path), counters, histograms)
+                merged.append(path)
+        if merged:
+            _write(
+                dead_path,
+                {
+                    "counters": [[name, labels, value] for (name, labels), value in counters.items()],
+                    "histograms": [[name, labels, values] for (name, labels), values in histograms.items()],
+                },
+            )
+            for path in merged:
+                os.unlink(path)
+
+
+def _collect() -> Tuple[Dict[Tuple[str, Labels], float], Dict[Tuple[str, Labels], List[float]]]:
+    metrics_dir = _get_metrics_dir()
+    if not metrics_dir:
+        with _lock:
+            _check_pid()
+            return dict(_counters), {key: list(values) for key, values in _histograms.items()}
+    _dump(force=True)
+    if HAS_FCNTL:
+        _merge_dead(metrics_dir)
+    counters: Dict[Tuple[str, Labels], float] = defaultdict(float)
+    histograms: Dict[Tuple[str, Labels], List[float]] = {}
+    for file_name in os.listdir(metrics_dir):
+        if file_name.endswith(".json"):
+            _merge(_read(os.path.join(metrics_dir, file_name)), counters, histograms)
+    return counters, histograms
+
+
+def _format_labels(labels: Iterable[Tuple[str, str]]) -> str:
+    escaped = [
+        '%s="%s"' % (key, str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+        for key, value in labels
+    ]
+    return "{%s}" % ",".join(escaped) if escaped else ""
+
+
+def render() -> str:
+    """Render all metrics in the Prometheus text exposition format."""
+    counters, histograms = _collect()
+    lines = []
+    for name, help_text in COUNTERS.items():
+        lines.append("# HELP %s %s" % (name, help_text))
+        lines.append("# TYPE %s counter" % name)
+        for (metric_name, labels), value in sorted(counters.items()):
+            if metric_name == name:
+                lines.append("%s%s %s" % (name, _format_labels(labels), repr(value)))
+    for name, help_text in HISTOGRAMS.items():
+        lines.append("# HELP %s %s" % (name, help_text))
+        lines.append("# TYPE %s histogram" % name)
+        for (metric_name, labels), values in sorted(histograms.items()):
+            if metric_name != name:
+                continue
+            for bound, count in zip(BUCKETS, values):
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append("%s_bucket%s %s" % (name, _format_labels(labels + (("le", le),)), repr(count)))
+            lines.append("%s_sum%s %s" % (name, _format_labels(labels), repr(values[-2])))
+            lines.append("%s_count%s %s" % (name, _format_labels(labels), repr(values[-1])))
+    return "\n".join(lines) + "\n"
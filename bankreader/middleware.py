@@ -0,0 +1,34 @@
+from typing import Callable
+
+from django.conf import settings
+from django.http import HttpRequest, HttpResponse
+
+from . import routers
+
+
+class ReadYourWritesMiddleware:
+    """Route reads of a client to the primary database for a while after it wrote anything."""
+
+    cookie_name = "bankreader_primary"
+
+    def __init__(self, get_response: Callable[[HttpRequest], HttpResponse]) -> None:
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        # context variables of a thread outlive the request, they are reset for each one
+        pinned_token = routers.pinned.set(self.cookie_name in request.COOKIES)
+        try:
+            with routers.track_writes():
+                response = self.get_response(request)
+                written = routers.written.get()
+        finally:
+            routers.pinned.reset(pinned_token)
+        if written:
+            response.set_cookie(
+                self.cookie_name,
+                "1",
+                max_age=getattr(settings, "BANKREADER_READ_YOUR_WRITES", 10),
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
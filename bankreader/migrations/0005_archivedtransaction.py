@@ -0,0 +1,46 @@
+# Generated by Django 3.2.25 on 2026-10-19 13:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bankreader", "0004_defaults"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchivedTransaction",
+            fields=[
+                ("id", models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("transaction_id", models.CharField(max_length=256, verbose_name="transaction id")),
+                ("accounted_date", models.DateField(verbose_name="accounted date")),
+                ("archive", models.CharField(max_length=256, verbose_name="archive")),
+            ],
+            options={
+                "verbose_name": "archived transaction",
+                "verbose_name_plural": "archived transactions",
+                "ordering": ("accounted_date",),
+            },
+        ),
+        migrations.AddIndex(
+            model_name="transaction",
+            index=models.Index(fields=["account", "accounted_date"], name="bankreader__account_d11002_idx"),
+        ),
+        migrations.AddField(
+            model_name="archivedtransaction",
+            name="account",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="archived_transactions",
+                to="bankreader.account",
+                verbose_name="account",
+            ),
+        ),
+        migrations.AlterUniqueTogether(
+            name="archivedtransaction",
+            unique_together={("account", "transaction_id")},
+        ),
+    ]
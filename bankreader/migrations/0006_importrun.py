@@ -0,0 +1,67 @@
+# Generated by Django 3.2.25 on 2026-10-19 13:06
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bankreader", "0005_archivedtransaction"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ImportRun",
+            fields=[
+                ("id", models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("created", models.DateTimeField(auto_now_add=True, verbose_name="created")),
+                ("reader", models.CharField(max_length=150, verbose_name="account statement format")),
+                ("file_name", models.CharField(max_length=256, verbose_name="file name")),
+                ("file_size", models.BigIntegerField(default=0, verbose_name="file size")),
+                ("digest", models.CharField(blank=True, default="", max_length=64, verbose_name="SHA-256 digest")),
+                ("total_count", models.PositiveIntegerField(default=0, verbose_name="transactions")),
+                ("new_count", models.PositiveIntegerField(default=0, verbose_name="new transactions")),
+                ("duplicate_count", models.PositiveIntegerField(default=0, verbose_name="duplicate transactions")),
+                ("failed_count", models.PositiveIntegerField(default=0, verbose_name="failed transactions")),
+                ("read_duration", models.FloatField(default=0.0, verbose_name="read duration")),
+                ("save_duration", models.FloatField(default=0.0, verbose_name="save duration")),
+                ("duration", models.FloatField(default=0.0, verbose_name="duration")),
+                (
+                    "peak_memory",
+                    models.BigIntegerField(
+                        blank=True,
+                        help_text="Only measured when tracemalloc is tracing.",
+                        null=True,
+                        verbose_name="peak memory",
+                    ),
+                ),
+                ("error", models.TextField(blank=True, default="", verbose_name="error")),
+                (
+                    "account",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="import_runs",
+                        to="bankreader.account",
+                        verbose_name="account",
+                    ),
+                ),
+                (
+                    "account_statement",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="import_runs",
+                        to="bankreader.accountstatement",
+                        verbose_name="account statement",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "import run",
+                "verbose_name_plural": "import runs",
+                "ordering": ("-created",),
+            },
+        ),
+    ]
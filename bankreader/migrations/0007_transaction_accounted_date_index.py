@@ -0,0 +1,17 @@
+# Generated by Django 3.2.25 on 2026-10-19 13:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bankreader", "0006_importrun"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="transaction",
+            index=models.Index(fields=["accounted_date"], name="bankreader__account_bc92fd_idx"),
+        ),
+    ]
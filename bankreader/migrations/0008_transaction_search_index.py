@@ -0,0 +1,52 @@
+from django.apps.registry import Apps
+from django.db import migrations
+from django.db.backends.base.schema import BaseDatabaseSchemaEditor
+from django.db.utils import OperationalError
+
+FTS_TABLE = "bankreader_transaction_fts"
+SEARCH_FIELDS = ("sender_description", "recipient_description", "remote_account_name")
+
+
+def create_search_index(apps: Apps, schema_editor: BaseDatabaseSchemaEditor) -> None:
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        try:
+            schema_editor.execute(
+                "CREATE VIRTUAL TABLE %s USING fts5(%s, tokenize='unicode61 remove_diacritics 2')"
+                % (FTS_TABLE, ", ".join(SEARCH_FIELDS))
+            )
+        except OperationalError:
+            # SQLite compiled without FTS5, searching falls back to substring lookups
+            return
+        schema_editor.execute(
+            "INSERT INTO %s (rowid, %s) SELECT id, %s FROM bankreader_transaction"
+            % (FTS_TABLE, ", ".join(SEARCH_FIELDS), ", ".join(SEARCH_FIELDS))
+        )
+    elif vendor == "postgresql":
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for field in SEARCH_FIELDS:
+            # the expression matches the one used by Django for icontains lookups
+            schema_editor.execute(
+                'CREATE INDEX bankreader_transaction_%s_trgm ON bankreader_transaction USING gin (UPPER("%s"::text) gin_trgm_ops)'
+                % (field, field)
+            )
+
+
+def drop_search_index(apps: Apps, schema_editor: BaseDatabaseSchemaEditor) -> None:
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        schema_editor.execute("DROP TABLE IF EXISTS %s" % FTS_TABLE)
+    elif vendor == "postgresql":
+        for field in SEARCH_FIELDS:
+            schema_editor.execute("DROP INDEX IF EXISTS bankreader_transaction_%s_trgm" % field)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bankreader", "0007_transaction_accounted_date_index"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 3.2.25 on 2026-10-19 13:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bankreader", "0008_transaction_search_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="accountstatement",
+            name="digest",
+            field=models.CharField(
+                blank=True, default="", editable=False, max_length=64, verbose_name="SHA-256 digest"
+            ),
+        ),
+    ]
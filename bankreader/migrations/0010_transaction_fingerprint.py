@@ -0,0 +1,31 @@
+# Generated by Django 3.2.25 on 2026-10-19 13:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bankreader", "0009_accountstatement_digest"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="archivedtransaction",
+            name="fingerprint",
+            field=models.CharField(blank=True, default="", max_length=64, verbose_name="fingerprint"),
+        ),
+        migrations.AddField(
+            model_name="transaction",
+            name="fingerprint",
+            field=models.CharField(blank=True, default="", editable=False, max_length=64, verbose_name="fingerprint"),
+        ),
+        migrations.AddIndex(
+            model_name="archivedtransaction",
+            index=models.Index(fields=["account", "fingerprint"], name="bankreader__account_916c6b_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="transaction",
+            index=models.Index(fields=["account", "fingerprint"], name="bankreader__account_be94ef_idx"),
+        ),
+    ]
@@ -0,0 +1,92 @@
+# Generated by Django 3.2.25 on 2026-10-19 13:28
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bankreader", "0010_transaction_fingerprint"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="IngestJob",
+            fields=[
+                ("id", models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("file_name", models.CharField(max_length=256, verbose_name="file name")),
+                (
+                    "path",
+                    models.CharField(
+                        blank=True,
+                        default="",
+                        help_text="Statement file on storage shared by all workers.",
+                        max_length=1024,
+                        verbose_name="path",
+                    ),
+                ),
+                (
+                    "digest",
+                    models.CharField(
+                        blank=True,
+                        default="",
+                        help_text="Statement file in the statement store.",
+                        max_length=64,
+                        verbose_name="SHA-256 digest",
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "pending"),
+                            ("running", "running"),
+                            ("done", "done"),
+                            ("failed", "failed"),
+                        ],
+                        default="pending",
+                        max_length=16,
+                        verbose_name="status",
+                    ),
+                ),
+                ("created", models.DateTimeField(auto_now_add=True, verbose_name="created")),
+                ("available_at", models.DateTimeField(default=django.utils.timezone.now, verbose_name="available at")),
+                ("leased_until", models.DateTimeField(blank=True, null=True, verbose_name="leased until")),
+                ("worker", models.CharField(blank=True, default="", max_length=256, verbose_name="worker")),
+                ("attempts", models.PositiveIntegerField(default=0, verbose_name="attempts")),
+                ("max_attempts", models.PositiveIntegerField(default=3, verbose_name="max attempts")),
+                ("error", models.TextField(blank=True, default="", verbose_name="error")),
+                (
+                    "account",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="ingest_jobs",
+                        to="bankreader.account",
+                        verbose_name="account",
+                    ),
+                ),
+                (
+                    "import_run",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="bankreader.importrun",
+                        verbose_name="import run",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "ingest job",
+                "verbose_name_plural": "ingest jobs",
+                "ordering": ("-created",),
+            },
+        ),
+        migrations.AddIndex(
+            model_name="ingestjob",
+            index=models.Index(fields=["status", "available_at"], name="bankreader__status_919b6c_idx"),
+        ),
+    ]
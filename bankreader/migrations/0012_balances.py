@@ -0,0 +1,40 @@
+# Generated by Django 3.2.25 on 2026-10-19 13:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bankreader", "0011_ingestjob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="accountstatement",
+            name="closing_balance",
+            field=models.DecimalField(
+                blank=True, decimal_places=2, editable=False, max_digits=20, null=True, verbose_name="closing balance"
+            ),
+        ),
+        migrations.AddField(
+            model_name="accountstatement",
+            name="opening_balance",
+            field=models.DecimalField(
+                blank=True, decimal_places=2, editable=False, max_digits=20, null=True, verbose_name="opening balance"
+            ),
+        ),
+        migrations.AddField(
+            model_name="transaction",
+            name="balance",
+            field=models.DecimalField(
+                blank=True,
+                decimal_places=2,
+                editable=False,
+                help_text="Running balance of the account after the transaction.",
+                max_digits=20,
+                null=True,
+                verbose_name="balance",
+            ),
+        ),
+    ]
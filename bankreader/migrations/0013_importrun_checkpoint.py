@@ -0,0 +1,24 @@
+# Generated by Django 3.2.25 on 2026-10-19 13:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bankreader", "0012_balances"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="importrun",
+            name="checkpoint",
+            field=models.JSONField(
+                blank=True,
+                editable=False,
+                help_text="Position of the last committed transaction of an unfinished resumable import.",
+                null=True,
+                verbose_name="checkpoint",
+            ),
+        ),
+    ]
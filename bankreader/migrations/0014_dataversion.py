@@ -0,0 +1,34 @@
+# Generated by Django 3.2.25 on 2026-10-19 14:40
+
+from django.apps.registry import Apps
+from django.db import migrations, models
+from django.db.backends.base.schema import BaseDatabaseSchemaEditor
+import django.utils.timezone
+
+
+def create_data_version(apps: Apps, schema_editor: BaseDatabaseSchemaEditor) -> None:
+    DataVersion = apps.get_model("bankreader", "DataVersion")
+    DataVersion.objects.using(schema_editor.connection.alias).get_or_create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bankreader", "0013_importrun_checkpoint"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DataVersion",
+            fields=[
+                ("id", models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("version", models.PositiveBigIntegerField(default=0, verbose_name="version")),
+                ("updated", models.DateTimeField(default=django.utils.timezone.now, verbose_name="updated")),
+            ],
+            options={
+                "verbose_name": "data version",
+                "verbose_name_plural": "data versions",
+            },
+        ),
+        migrations.RunPython(create_data_version, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,120 @@
+# Generated by Django 3.2.25 on 2026-10-19 14:44
+
+import hashlib
+from collections import Counter
+from decimal import Decimal
+from itertools import groupby
+from operator import attrgetter
+from typing import Any, Set
+
+from django.apps.registry import Apps
+from django.db import migrations, models
+from django.db.backends.base.schema import BaseDatabaseSchemaEditor
+
+# the fingerprints as computed by the readers when this migration was written
+FINGERPRINT_READERS = ("bankreader.readers.mt940.MT940Reader",)
+FINGERPRINT_FIELDS = (
+    "accounted_date",
+    "amount",
+    "remote_account_number",
+    "variable_symbol",
+    "constant_symbol",
+    "specific_symbol",
+    "sender_description",
+    "recipient_description",
+)
+BATCH_SIZE = 500
+
+
+def get_fingerprint(transaction: Any, occurrence: int) -> str:
+    values = []
+    for field in FINGERPRINT_FIELDS:
+        value = getattr(transaction, field)
+        values.append(format(value, ".2f") if isinstance(value, Decimal) else str(value))
+    values.append(str(occurrence))
+    return hashlib.sha256("\x1f".join(values).encode()).hexdigest()
+
+
+def fill_missing_fingerprints(apps: Apps, schema_editor: BaseDatabaseSchemaEditor) -> None:
+    # accounts of other readers using fingerprints may be filled later using the command fingerprinttransactions
+    Account = apps.get_model("bankreader", "Account")
+    Transaction = apps.get_model("bankreader", "Transaction")
+    ArchivedTransaction = apps.get_model("bankreader", "ArchivedTransaction")
+    using = schema_editor.connection.alias
+    for account_id in Account.objects.using(using).filter(reader__in=FINGERPRINT_READERS).values_list("pk", flat=True):
+        existing: Set[str] = set()
+        for model in (Transaction, ArchivedTransaction):
+            existing.update(
+                model.objects.using(using)
+                .filter(account_id=account_id)
+                .exclude(fingerprint="")
+                .values_list("fingerprint", flat=True)
+            )
+        filled = []
+        rows = Transaction.objects.using(using).filter(account_id=account_id).order_by("account_statement_id", "pk")
+        for _, group in groupby(rows.iterator(), key=attrgetter("account_statement_id")):
+            occurrences: Counter = Counter()
+            for transaction in group:
+                key = get_fingerprint(transaction, 0)
+                occurrences[key] += 1
+                fingerprint = key if occurrences[key] == 1 else get_fingerprint(transaction, occurrences[key] - 1)
+                # transactions equal to another one of the account keep only their transaction id
+                if transaction.fingerprint or fingerprint in existing:
+                    continue
+                existing.add(fingerprint)
+                transaction.fingerprint = fingerprint
+                if not transaction.transaction_id:
+                    transaction.transaction_id = fingerprint
+                filled.append(transaction)
+        Transaction.objects.using(using).bulk_update(filled, ["fingerprint", "transaction_id"], batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bankreader", "0014_dataversion"),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name="archivedtransaction",
+            unique_together=set(),
+        ),
+        migrations.AlterUniqueTogether(
+            name="transaction",
+            unique_together=set(),
+        ),
+        migrations.AddConstraint(
+            model_name="archivedtransaction",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("fingerprint", "")),
+                fields=("account", "transaction_id"),
+                name="bankreader_archivedtransaction_unique_id",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="archivedtransaction",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("fingerprint", ""), _negated=True),
+                fields=("account", "fingerprint"),
+                name="bankreader_archivedtransaction_unique_fingerprint",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="transaction",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("fingerprint", "")),
+                fields=("account", "transaction_id"),
+                name="bankreader_transaction_unique_id",
+            ),
+        ),
+        migrations.RunPython(fill_missing_fingerprints, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="transaction",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("fingerprint", ""), _negated=True),
+                fields=("account", "fingerprint"),
+                name="bankreader_transaction_unique_fingerprint",
+            ),
+        ),
+    ]
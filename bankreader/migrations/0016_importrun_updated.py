@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-19 14:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bankreader", "0015_transaction_unique_key"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="importrun",
+            name="updated",
+            field=models.DateTimeField(auto_now=True, db_index=True, verbose_name="updated"),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 3.2.25 on 2026-10-19 14:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bankreader", "0016_importrun_updated"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="accountstatement",
+            name="incomplete",
+            field=models.BooleanField(
+                default=False,
+                editable=False,
+                help_text="Only part of the transactions was committed by an unfinished or failed resumable import.",
+                verbose_name="incomplete",
+            ),
+        ),
+    ]
@@ -0,0 +1,35 @@
+from django.apps.registry import Apps
+from django.db import migrations
+from django.db.backends.base.schema import BaseDatabaseSchemaEditor
+
+FTS_TABLE = "bankreader_transaction_fts"
+TRIGGER = "bankreader_transaction_fts_delete"
+
+
+def create_delete_trigger(apps: Apps, schema_editor: BaseDatabaseSchemaEditor) -> None:
+    connection = schema_editor.connection
+    # the table is missing with SQLite compiled without FTS5
+    if connection.vendor != "sqlite" or FTS_TABLE not in connection.introspection.table_names():
+        return
+    # removes transactions deleted in any way (cascades, bulk deletes, archiving) from the search index
+    schema_editor.execute("DELETE FROM %s WHERE rowid NOT IN (SELECT id FROM bankreader_transaction)" % FTS_TABLE)
+    schema_editor.execute(
+        "CREATE TRIGGER %s AFTER DELETE ON bankreader_transaction BEGIN DELETE FROM %s WHERE rowid = old.id; END"
+        % (TRIGGER, FTS_TABLE)
+    )
+
+
+def drop_delete_trigger(apps: Apps, schema_editor: BaseDatabaseSchemaEditor) -> None:
+    if schema_editor.connection.vendor == "sqlite":
+        schema_editor.execute("DROP TRIGGER IF EXISTS %s" % TRIGGER)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bankreader", "0017_accountstatement_incomplete"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_delete_trigger, drop_delete_trigger),
+    ]
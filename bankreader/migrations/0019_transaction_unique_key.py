@@ -0,0 +1,25 @@
+# Generated by Django 3.2.25 on 2026-10-19 15:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bankreader", "0018_transaction_search_index_delete"),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name="archivedtransaction",
+            constraint=models.UniqueConstraint(
+                fields=("account", "transaction_id", "fingerprint"), name="bankreader_archivedtransaction_unique_key"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="transaction",
+            constraint=models.UniqueConstraint(
+                fields=("account", "transaction_id", "fingerprint"), name="bankreader_transaction_unique_key"
+            ),
+        ),
+    ]
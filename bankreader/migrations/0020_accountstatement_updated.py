@@ -0,0 +1,41 @@
+# Generated by Django 3.2.25 on 2026-10-19 16:02
+
+import django.utils.timezone
+from django.apps.registry import Apps
+from django.db import migrations, models
+from django.db.backends.base.schema import BaseDatabaseSchemaEditor
+from django.db.models import OuterRef, Subquery
+
+
+def copy_import_run_updated(apps: Apps, schema_editor: BaseDatabaseSchemaEditor) -> None:
+    # statements keep the time of their last import, so that existing snapshots are updated incrementally
+    AccountStatement = apps.get_model("bankreader", "AccountStatement")
+    ImportRun = apps.get_model("bankreader", "ImportRun")
+    using = schema_editor.connection.alias
+    last_run = (
+        ImportRun.objects.using(using).filter(account_statement=OuterRef("pk")).order_by("-updated").values("updated")
+    )
+    AccountStatement.objects.using(using).filter(import_runs__isnull=False).update(updated=Subquery(last_run[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bankreader", "0019_transaction_unique_key"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="accountstatement",
+            name="updated",
+            field=models.DateTimeField(
+                auto_now=True, db_index=True, default=django.utils.timezone.now, verbose_name="updated"
+            ),
+            preserve_default=False,
+        ),
+        migrations.RunPython(copy_import_run_updated, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name="importrun",
+            name="updated",
+        ),
+    ]
@@ -1,11 +1,22 @@
-from typing import Iterable, List
+import datetime
+from decimal import Decimal
+from typing import Any, Iterable, List, Set
 
-from django.db import IntegrityError, models, transaction as db_transaction
-from django.utils.translation import gettext, gettext_lazy as _
+from django.db import connections, models, router
+from django.db.models import F, Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
 from localflavor.generic.models import BICField, IBANField
 
+from . import date_index, search
+from .oncommit import collect_on_commit
 from .readers import readers
-from .readers.base import BaseReader
+from .readers.base import TRANSACTION_ID, BaseReader, normalize_account_number
+
+# maximum number of parameters used in a single IN lookup
+LOOKUP_BATCH_SIZE = 500
 
 
 class Account(models.Model):
@@ -29,6 +40,53 @@ class Account(models.Model):
     def get_reader(self) -> BaseReader | None:
         return readers.get(self.reader) if self.reader is not None else None
 
+    def lock(self) -> None:
+        """Lock the account until the end of current database transaction."""
+        db = router.db_for_write(Account, instance=self)
+        if connections[db].features.has_select_for_update:
+            list(Account.objects.using(db).select_for_update().filter(pk=self.pk).values_list("pk", flat=True))
+        else:
+            # no-op update acquires the write lock on backends without SELECT ... FOR UPDATE (SQLite)
+            Account.objects.using(db).filter(pk=self.pk).update(name=models.F("name"))
+
+    def get_balance(self, date: datetime.date | None = None) -> Decimal | None:
+        """Return balance of the account at the end of given day (or now), if it is known."""
+        transactions = Transaction.objects.filter(account=self)
+        if date is not None:
+            transactions = transactions.filter(accounted_date__lte=date)
+        return transactions.order_by("-accounted_date", "-pk").values_list("balance", flat=True).first()
+
+    def get_duplicate_key(self) -> str:
+        """Return name of the transaction field used to recognize already imported transactions."""
+        reader = self.get_reader()
+        return reader.duplicate_key if reader is not None else TRANSACTION_ID
+
+    def get_source_keys(self) -> Set[str]:
+        """Return normalized account numbers, which identify the account in statement headers."""
+        if not self.iban:
+            return set()
+        iban = normalize_account_number(self.iban)
+        keys = {iban}
+        if iban[:2] in ("CZ", "SK"):
+            # domestic prefix and account number
+            keys.add(iban[8:24])
+        return keys
+
+    def get_existing_keys(self, keys: Iterable[str], key_field: str = TRANSACTION_ID) -> Set[str]:
+        """Return those of given transaction ids (or fingerprints), which are already stored (or archived)."""
+        keys = list(keys)
+        existing_keys: Set[str] = set()
+        for start in range(0, len(keys), LOOKUP_BATCH_SIZE):
+            end = start + LOOKUP_BATCH_SIZE
+            batch = keys[start:end]
+            for model in (Transaction, ArchivedTransaction):
+                existing_keys.update(
+                    model.objects.filter(account=self, **{f"{key_field}__in": batch}).values_list(  # type: ignore
+                        key_field, flat=True
+                    )
+                )
+        return existing_keys
+
 
 class AccountStatement(models.Model):
     account = models.ForeignKey(
@@ -41,6 +99,21 @@ class AccountStatement(models.Model):
     statement = models.CharField(_("statement"), max_length=256)
     from_date = models.DateField(_("from date"), editable=False)
     to_date = models.DateField(_("to date"), editable=False)
+    digest = models.CharField(_("SHA-256 digest"), blank=True, default="", editable=False, max_length=64)
+    opening_balance = models.DecimalField(
+        _("opening balance"), blank=True, decimal_places=2, editable=False, max_digits=20, null=True
+    )
+    closing_balance = models.DecimalField(
+        _("closing balance"), blank=True, decimal_places=2, editable=False, max_digits=20, null=True
+    )
+    incomplete = models.BooleanField(
+        _("incomplete"),
+        default=False,
+        editable=False,
+        help_text=_("Only part of the transactions was committed by an unfinished or failed resumable import."),
+    )
+    # saved with each commit of its transactions, snapshots are updated with recently updated statements
+    updated = models.DateTimeField(_("updated"), auto_now=True, db_index=True)
 
     class Meta:
         ordering = ("from_date",)
@@ -50,26 +123,23 @@ class AccountStatement(models.Model):
     def __str__(self) -> str:
         return self.statement
 
-    @db_transaction.atomic
     def save_with_transactions(self, transactions: Iterable["Transaction"]) -> List[str]:
-        self.from_date = min(td.accounted_date for td in transactions)
-        self.to_date = max(td.accounted_date for td in transactions)
-        self.save()
-        messages = []
-        for transaction in transactions:
-            try:
-                with db_transaction.atomic():
-                    transaction.account = self.account
-                    transaction.account_statement = self
-                    transaction.save()
-            except IntegrityError:
-                messages.append(
-                    gettext('Transaction "{transaction_id}" already exists for account "{account_name}".').format(
-                        transaction_id=transaction.transaction_id,
-                        account_name=self.account.name,
-                    )
-                )
-        return messages
+        """Save transactions, which were already read, and return messages about duplicate ones."""
+        from .ingest import Pipeline
+
+        return Pipeline(self.account).save(self, transactions).messages
+
+
+@receiver(post_delete, sender=AccountStatement)
+@receiver(post_delete, sender="bankreader.Transaction")
+def invalidate_date_index(instance: "AccountStatement | Transaction", using: str, **kwargs: Any) -> None:
+    date_index.invalidate_on_commit(instance.account_id, using)
+
+
+class TransactionQuerySet(models.QuerySet):
+    def search(self, text: str) -> "TransactionQuerySet":
+        """Filter transactions by words in descriptions or remote account name using the search index."""
+        return search.search(self, text)  # type: ignore
 
 
 class Transaction(models.Model):
@@ -91,10 +161,51 @@ class Transaction(models.Model):
     specific_symbol = models.BigIntegerField(_("specific symbol"), default=0)
     sender_description = models.CharField(_("description for sender"), default="", max_length=256)
     recipient_description = models.CharField(_("description for recipient"), default="", max_length=256)
+    fingerprint = models.CharField(_("fingerprint"), blank=True, default="", editable=False, max_length=64)
+    balance = models.DecimalField(
+        _("balance"),
+        blank=True,
+        decimal_places=2,
+        editable=False,
+        help_text=_("Running balance of the account after the transaction."),
+        max_digits=20,
+        null=True,
+    )
+
+    objects = TransactionQuerySet.as_manager()
+
+    # IBAN or account number of the statement the transaction was read from, if the reader knows it
+    source_account = ""
+    # position in the statement file after the transaction, where reading may resume:
+    # index of the (ZIP member) file and byte offset in it, set by resumable readers
+    source_member = 0
+    source_offset = 0
 
     class Meta:
         ordering = ("accounted_date",)
-        unique_together = ("account", "transaction_id")
+        # transactions are unique by their duplicate key, fingerprints are only set by readers using them
+        constraints = [
+            models.UniqueConstraint(
+                fields=["account", "transaction_id"],
+                condition=Q(fingerprint=""),
+                name="bankreader_transaction_unique_id",
+            ),
+            models.UniqueConstraint(
+                fields=["account", "fingerprint"],
+                condition=~Q(fingerprint=""),
+                name="bankreader_transaction_unique_fingerprint",
+            ),
+            # backends without partial indexes (MySQL) only enforce this one
+            models.UniqueConstraint(
+                fields=["account", "transaction_id", "fingerprint"],
+                name="bankreader_transaction_unique_key",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["account", "accounted_date"]),
+            models.Index(fields=["accounted_date"]),
+            models.Index(fields=["account", "fingerprint"]),
+        ]
         verbose_name = _("transaction")
         verbose_name_plural = _("transactions")
 
@@ -102,8 +213,204 @@ class Transaction(models.Model):
         return f"{self.accounted_date} {self.amount} {self.remote_account_name} {self.sender_description}"
 
     def save(self, *args, **kwargs) -> None:
+        self.set_missing_dates()
+        return super().save(**kwargs)
+
+    def set_missing_dates(self) -> None:
         if self.entry_date is None and self.accounted_date is not None:
             self.entry_date = self.accounted_date
         if self.accounted_date is None and self.entry_date is not None:
             self.accounted_date = self.entry_date
-        return super().save(**kwargs)
+
+
+class ArchivedTransaction(models.Model):
+    """Compact key of a transaction moved to cold storage, kept for duplicate checks."""
+
+    account = models.ForeignKey(
+        Account,
+        on_delete=models.CASCADE,
+        related_name="archived_transactions",
+        verbose_name=_("account"),
+    )
+    transaction_id = models.CharField(_("transaction id"), max_length=256)
+    accounted_date = models.DateField(_("accounted date"))
+    fingerprint = models.CharField(_("fingerprint"), blank=True, default="", max_length=64)
+    archive = models.CharField(_("archive"), max_length=256)
+
+    class Meta:
+        ordering = ("accounted_date",)
+        # transactions are unique by their duplicate key, fingerprints are only set by readers using them
+        constraints = [
+            models.UniqueConstraint(
+                fields=["account", "transaction_id"],
+                condition=Q(fingerprint=""),
+                name="bankreader_archivedtransaction_unique_id",
+            ),
+            models.UniqueConstraint(
+                fields=["account", "fingerprint"],
+                condition=~Q(fingerprint=""),
+                name="bankreader_archivedtransaction_unique_fingerprint",
+            ),
+            # backends without partial indexes (MySQL) only enforce this one
+            models.UniqueConstraint(
+                fields=["account", "transaction_id", "fingerprint"],
+                name="bankreader_archivedtransaction_unique_key",
+            ),
+        ]
+        indexes = [models.Index(fields=["account", "fingerprint"])]
+        verbose_name = _("archived transaction")
+        verbose_name_plural = _("archived transactions")
+
+    def __str__(self) -> str:
+        return f"{self.account_id} {self.transaction_id}"
+
+
+class DataVersion(models.Model):
+    """Single row counting committed changes of accounts, account statements and transactions.
+
+    ETag and Last-Modified headers of the API are derived from it.
+    """
+
+    version = models.PositiveBigIntegerField(_("version"), default=0)
+    updated = models.DateTimeField(_("updated"), default=timezone.now)
+
+    class Meta:
+        verbose_name = _("data version")
+        verbose_name_plural = _("data versions")
+
+    def __str__(self) -> str:
+        return str(self.version)
+
+    @classmethod
+    def get_current(cls) -> "DataVersion":
+        return cls.objects.filter(pk=1).first() or cls(pk=1)
+
+    @classmethod
+    def bump(cls, using: str) -> None:
+        if not cls.objects.using(using).filter(pk=1).update(version=F("version") + 1, updated=timezone.now()):
+            cls.objects.using(using).get_or_create(pk=1, defaults={"version": 1})
+
+
+@receiver(post_save, sender=Account)
+@receiver(post_delete, sender=Account)
+@receiver(post_save, sender=AccountStatement)
+@receiver(post_delete, sender=AccountStatement)
+@receiver(post_save, sender="bankreader.Transaction")
+@receiver(post_delete, sender="bankreader.Transaction")
+def bump_data_version(using: str, **kwargs: Any) -> None:
+    collect_on_commit("data_version", None, lambda items: DataVersion.bump(using), using)
+
+
+class ImportRun(models.Model):
+    """Record of a single account statement import with its performance metrics."""
+
+    account = models.ForeignKey(
+        Account,
+        on_delete=models.CASCADE,
+        related_name="import_runs",
+        verbose_name=_("account"),
+    )
+    account_statement = models.ForeignKey(
+        AccountStatement,
+        blank=True,
+        null=True,
+        on_delete=models.SET_NULL,
+        related_name="import_runs",
+        verbose_name=_("account statement"),
+    )
+    created = models.DateTimeField(_("created"), auto_now_add=True)
+    reader = models.CharField(_("account statement format"), max_length=150)
+    file_name = models.CharField(_("file name"), max_length=256)
+    file_size = models.BigIntegerField(_("file size"), default=0)
+    digest = models.CharField(_("SHA-256 digest"), blank=True, default="", max_length=64)
+    total_count = models.PositiveIntegerField(_("transactions"), default=0)
+    new_count = models.PositiveIntegerField(_("new transactions"), default=0)
+    duplicate_count = models.PositiveIntegerField(_("duplicate transactions"), default=0)
+    failed_count = models.PositiveIntegerField(_("failed transactions"), default=0)
+    read_duration = models.FloatField(_("read duration"), default=0.0)
+    save_duration = models.FloatField(_("save duration"), default=0.0)
+    duration = models.FloatField(_("duration"), default=0.0)
+    peak_memory = models.BigIntegerField(
+        _("peak memory"),
+        blank=True,
+        help_text=_("Only measured when tracemalloc is tracing."),
+        null=True,
+    )
+    error = models.TextField(_("error"), blank=True, default="")
+    checkpoint = models.JSONField(
+        _("checkpoint"),
+        blank=True,
+        editable=False,
+        help_text=_("Position of the last committed transaction of an unfinished resumable import."),
+        null=True,
+    )
+
+    class Meta:
+        ordering = ("-created",)
+        verbose_name = _("import run")
+        verbose_name_plural = _("import runs")
+
+    def __str__(self) -> str:
+        return f"{self.created:%Y-%m-%d %H:%M:%S} {self.file_name}"
+
+
+class IngestJob(models.Model):
+    """Statement file waiting to be imported by any of the bankreaderworker processes."""
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = (
+        (PENDING, _("pending")),
+        (RUNNING, _("running")),
+        (DONE, _("done")),
+        (FAILED, _("failed")),
+    )
+
+    account = models.ForeignKey(
+        Account,
+        on_delete=models.CASCADE,
+        related_name="ingest_jobs",
+        verbose_name=_("account"),
+    )
+    file_name = models.CharField(_("file name"), max_length=256)
+    path = models.CharField(
+        _("path"),
+        blank=True,
+        default="",
+        help_text=_("Statement file on storage shared by all workers."),
+        max_length=1024,
+    )
+    digest = models.CharField(
+        _("SHA-256 digest"),
+        blank=True,
+        default="",
+        help_text=_("Statement file in the statement store."),
+        max_length=64,
+    )
+    status = models.CharField(_("status"), choices=STATUS_CHOICES, default=PENDING, max_length=16)
+    created = models.DateTimeField(_("created"), auto_now_add=True)
+    available_at = models.DateTimeField(_("available at"), default=timezone.now)
+    leased_until = models.DateTimeField(_("leased until"), blank=True, null=True)
+    worker = models.CharField(_("worker"), blank=True, default="", max_length=256)
+    attempts = models.PositiveIntegerField(_("attempts"), default=0)
+    max_attempts = models.PositiveIntegerField(_("max attempts"), default=3)
+    import_run = models.ForeignKey(
+        ImportRun,
+        blank=True,
+        null=True,
+        on_delete=models.SET_NULL,
+        related_name="+",
+        verbose_name=_("import run"),
+    )
+    error = models.TextField(_("error"), blank=True, default="")
+
+    class Meta:
+        ordering = ("-created",)
+        indexes = [models.Index(fields=["status", "available_at"])]
+        verbose_name = _("ingest job")
+        verbose_name_plural = _("ingest jobs")
+
+    def __str__(self) -> str:
+        return f"{self.file_name} ({self.status})"
@@ -0,0 +1,34 @@
+"""
+Callbacks run once after the current database transaction is committed, however many changes it made.
+
+E.g. deleting an account statement deletes its transactions one by one, their accounts are collected
+and the callback is called once with all of them.
+"""
+
+from typing import Any, Callable, Hashable, Set
+
+from django.db import connections, transaction as db_transaction
+
+
+def collect_on_commit(name: str, item: Hashable, callback: Callable[[Set[Any]], None], using: str) -> None:
+    """Add the item to the set passed to the callback of given name after the commit (immediately outside of it)."""
+    connection = connections[using]
+    if not connection.in_atomic_block:
+        callback({item})
+        return
+    attribute = "bankreader_on_commit_%s" % name
+    pending = getattr(connection, attribute, None)
+    # the callback is dropped (with its items) when the transaction or its savepoint is rolled back
+    if pending is not None:
+        items, index, registered = pending
+        if index < len(connection.run_on_commit) and connection.run_on_commit[index][1] is registered:
+            items.add(item)
+            return
+    items = {item}
+
+    def run() -> None:
+        setattr(connection, attribute, None)
+        callback(items)
+
+    db_transaction.on_commit(run, using=using)
+    setattr(connection, attribute, (items, len(connection.run_on_commit) - 1, run))
@@ -0,0 +1,101 @@
+import json
+from typing import Any, Iterable, List
+
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ORDER_VAR, PAGE_VAR, ChangeList
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Field, Model, Q, QuerySet
+from django.http import HttpRequest
+from django.utils.functional import cached_property
+
+CURSOR_VAR = "cursor"
+
+
+def get_estimated_count(queryset: QuerySet) -> int | None:
+    """Return number of rows estimated by the query planner, if supported by the database backend."""
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql":
+        return None
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator using the planner estimate instead of COUNT(*) for large result sets."""
+
+    # estimates below this limit are replaced with exact count
+    exact_count_limit = 10000
+    estimated = False
+
+    @cached_property
+    def count(self) -> int:
+        if isinstance(self.object_list, QuerySet):  # type: ignore
+            estimated_count = get_estimated_count(self.object_list)
+            if estimated_count is not None and estimated_count > self.exact_count_limit:
+                self.estimated = True
+                return estimated_count
+        return super().count
+
+
+class KeysetChangeList(ChangeList):
+    """
+    ChangeList providing links to the next page using keyset pagination.
+
+    With the default descending ordering by ``model_admin.keyset_field`` (and primary key),
+    the next page is selected by the values of the last row instead of an OFFSET,
+    so that loading deep pages takes constant time.
+    """
+
+    def __init__(self, request: HttpRequest, *args: Any, **kwargs: Any) -> None:
+        self.cursor = request.GET.get(CURSOR_VAR)
+        self.next_page_url: str | None = None
+        super().__init__(request, *args, **kwargs)
+
+    @property
+    def first_page_url(self) -> str:
+        return self.get_query_string(remove=[CURSOR_VAR, PAGE_VAR])
+
+    def get_filters_params(self, params: dict | None = None) -> dict:
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(CURSOR_VAR, None)
+        return lookup_params
+
+    def get_query_string(self, new_params: dict | None = None, remove: Iterable[str] | None = None) -> str:
+        # keyset position is not valid with different filters or ordering
+        if not new_params or CURSOR_VAR not in new_params:
+            remove = [*(remove or ()), CURSOR_VAR]
+        return super().get_query_string(new_params, remove)
+
+    def get_results(self, request: HttpRequest) -> None:
+        super().get_results(request)
+        field_name: str = getattr(self.model_admin, "keyset_field")
+        if ORDER_VAR in self.params or (self.show_all and self.can_show_all) or not self.multi_page:
+            if self.cursor:
+                raise IncorrectLookupParameters()
+            return
+        if self.cursor:
+            value, _, pk = self.cursor.rpartition(".")
+            field = self.model._meta.get_field(field_name)
+            assert isinstance(field, Field) and self.model._meta.pk is not None
+            try:
+                value = field.to_python(value)
+                pk = self.model._meta.pk.to_python(pk)
+            except ValidationError:
+                raise IncorrectLookupParameters()
+            list_per_page = self.list_per_page
+            self.result_list = self.queryset.filter(
+                Q(**{f"{field_name}__lt": value}) | Q(**{field_name: value, "pk__lt": pk})
+            )[:list_per_page]
+        rows: List[Model] = list(self.result_list)
+        if len(rows) == self.list_per_page:
+            last_row = rows[-1]
+            value = getattr(last_row, field_name)
+            cursor = "%s.%s" % (value.isoformat() if hasattr(value, "isoformat") else value, last_row.pk)
+            self.next_page_url = self.get_query_string({CURSOR_VAR: cursor}, [PAGE_VAR])
@@ -0,0 +1,86 @@
+import datetime
+import os
+import time
+from decimal import Decimal
+from typing import IO, Iterable, List, Set
+
+from django.utils.translation import gettext
+
+from .models import LOOKUP_BATCH_SIZE, Account, Transaction
+from .readers.base import BaseReader
+
+
+class StatementPreview:
+    """Summary of an account statement, collected without writing anything to the database."""
+
+    def __init__(self, account: Account) -> None:
+        self.account = account
+        self.count = 0
+        self.new_count = 0
+        self.duplicate_count = 0
+        self.from_date: datetime.date | None = None
+        self.to_date: datetime.date | None = None
+        self.credit = Decimal(0)
+        self.debit = Decimal(0)
+        self.size = 0
+        self.duration = 0.0
+        self._key_field = account.get_duplicate_key()
+        self._seen_keys: Set[str] = set()
+        self._pending_keys: List[str] = []
+
+    @property
+    def rate(self) -> float:
+        return self.count / self.duration if self.duration else 0.0
+
+    def read(self, reader: BaseReader, statement_file: IO) -> "StatementPreview":
+        size = statement_file.seek(0, os.SEEK_END)
+        statement_file.seek(0)
+        return self.read_transactions(reader.read_file(statement_file), size)
+
+    def read_transactions(self, transactions: Iterable[Transaction], size: int) -> "StatementPreview":
+        self.size += size
+        start = time.monotonic()
+        for transaction in transactions:
+            self.count += 1
+            if self.from_date is None or transaction.accounted_date < self.from_date:
+                self.from_date = transaction.accounted_date
+            if self.to_date is None or transaction.accounted_date > self.to_date:
+                self.to_date = transaction.accounted_date
+            if transaction.amount > 0:
+                self.credit += transaction.amount
+            else:
+                self.debit += transaction.amount
+            key = getattr(transaction, self._key_field)
+            if key in self._seen_keys:
+                self.duplicate_count += 1
+                continue
+            self._seen_keys.add(key)
+            self._pending_keys.append(key)
+            if len(self._pending_keys) >= LOOKUP_BATCH_SIZE:
+                self._check_pending_keys()
+        self._check_pending_keys()
+        self.duration += time.monotonic() - start
+        return self
+
+    def _check_pending_keys(self) -> None:
+        duplicate_count = len(self.account.get_existing_keys(self._pending_keys, self._key_field))
+        self.duplicate_count += duplicate_count
+        self.new_count += len(self._pending_keys) - duplicate_count
+        self._pending_keys = []
+
+    def __str__(self) -> str:
+        return gettext(
+            "{count} transactions ({new_count} new, {duplicate_count} duplicate) from {from_date} to {to_date}, "
+            "credit {credit}, debit {debit}, read {size} bytes in {duration:.3f} s ({rate:.0f} transactions/s)."
+        ).format(
+            count=self.count,
+            new_count=self.new_count,
+            duplicate_count=self.duplicate_count,
+            from_date=self.from_date,
+            to_date=self.to_date,
+            credit=self.credit,
+            debit=self.debit,
+            size=self.size,
+            duration=self.duration,
+            rate=self.rate,
+        )
@@ -5,11 +5,19 @@ if TYPE_CHECKING:
 
 readers: Dict[str, "BaseReader"] = {}
 
+# sorted choices are cached until another reader is registered
+_reader_choices: list[tuple[str, str]] | None = None
+
 
 def get_reader_choices() -> list[tuple[str, str]]:
-    return sorted([(key, reader.label) for key, reader in readers.items()], key=lambda x: x[1])
+    global _reader_choices
+    if _reader_choices is None:
+        _reader_choices = sorted([(key, reader.label) for key, reader in readers.items()], key=lambda x: x[1])
+    return list(_reader_choices)
 
 
 def register_reader(reader: Type["BaseReader"]) -> Type["BaseReader"]:
+    global _reader_choices
     readers[getattr(reader, "key", "%s.%s" % (reader.__module__, reader.__name__))] = reader()
+    _reader_choices = None
     return reader
@@ -1,12 +1,93 @@
-from typing import IO, TYPE_CHECKING, Iterable
+import hashlib
+import io
+import itertools
+import os
+import re
+import time
+from collections import Counter
+from decimal import Decimal
+from typing import IO, TYPE_CHECKING, Iterable, Iterator, List, Tuple
 from zipfile import BadZipFile, ZipFile
 
+from .. import metrics
+
 if TYPE_CHECKING:
     from ..models import Transaction
 
+# strategies of recognizing already imported transactions
+TRANSACTION_ID = "transaction_id"
+FINGERPRINT = "fingerprint"
+
+
+def parse_amount(value: str, decimal_separator: str = ".") -> int:
+    """Parse textual amount into integer minor units (cents), ignoring any thousands separators and spaces.
+
+    The minus sign may precede or follow the amount (e.g. "100.00-").
+    """
+    # int() would accept underscores as digit separators
+    if "_" in value:
+        raise ValueError("Invalid amount: %r" % value)
+    try:
+        return int(value) * 100
+    except ValueError:
+        pass
+    integer, _, fraction = value.partition(decimal_separator)
+    integer_digits = "".join(filter(str.isdigit, integer))
+    fraction_digits = "".join(filter(str.isdigit, fraction)).ljust(2, "0")
+    if not (integer_digits or fraction) or fraction_digits[2:].strip("0"):
+        raise ValueError("Invalid amount: %r" % value)
+    cents = int(integer_digits or "0") * 100 + int(fraction_digits[:2])
+    return -cents if "-" in integer or fraction.rstrip().endswith("-") else cents
+
+
+IBAN_RE = re.compile(r"^[A-Z]{2}[0-9]{2}[0-9A-Z]+$")
+
+
+def normalize_account_number(value: str) -> str:
+    """Normalize IBAN or domestic account number ([prefix-]number[/bank code]) for comparison.
+
+    Domestic numbers are returned as 16 digits (6 digits of prefix and 10 digits of number),
+    as they are used in GPC headers and in Czech and Slovak IBANs.
+    """
+    value = "".join(value.split()).upper()
+    if IBAN_RE.match(value):
+        return value
+    # bank code (or BIC) may precede or follow the number
+    number = max(value.split("/"), key=lambda part: sum(char.isdigit() for char in part))
+    prefix, _, number = number.rpartition("-")
+    if not (prefix or "0").isdigit() or not number.isdigit():
+        return value
+    return prefix.zfill(6) + number.zfill(10) if prefix else number.zfill(16)
+
+
+def cents_to_decimal(cents: int) -> Decimal:
+    """Convert integer minor units (cents) to Decimal amount with two decimal places."""
+    return Decimal(cents).scaleb(-2)
+
 
 class BaseReader:
     encoding = "utf-8"
+    # field used to recognize already imported transactions,
+    # readers of banks without stable transaction ids should use FINGERPRINT
+    duplicate_key = TRANSACTION_ID
+    fingerprint_fields = (
+        "accounted_date",
+        "amount",
+        "remote_account_number",
+        "variable_symbol",
+        "constant_symbol",
+        "specific_symbol",
+        "sender_description",
+        "recipient_description",
+    )
+    # readers parsing the file line by line may read uploads while they are being received
+    incremental = False
+    # readers setting Transaction.source_account from the statement headers may import files of several accounts
+    has_source_account = False
+    # readers setting Transaction.source_offset may continue reading a file from there
+    resumable = False
+    # readers of line based formats may read ranges of a file starting at record boundaries in parallel
+    shardable = False
 
     @property
     def label(self) -> str:
@@ -14,15 +95,145 @@ class BaseReader:
 
     def read_file(self, statement_file: IO) -> Iterable["Transaction"]:
         """Try to unpack ZIP archive and call read() for each file."""
+        reader = "%s.%s" % (type(self).__module__, type(self).__name__)
+        metrics.inc("bankreader_bytes_processed_total", statement_file.seek(0, os.SEEK_END), reader=reader)
+        statement_file.seek(0)
+        start = time.monotonic()
+        if self.duplicate_key == FINGERPRINT:
+            yield from self.set_fingerprints(self._read_file(statement_file, reader))
+        else:
+            yield from self._read_file(statement_file, reader)
+        metrics.observe("bankreader_parse_duration_seconds", time.monotonic() - start, reader=reader)
+
+    def read_stream(self, statement_file: IO) -> Iterable["Transaction"]:
+        """Read transactions from a stream, which is neither seekable nor a ZIP archive."""
+        transactions = self.read_transactions(statement_file)
+        if self.duplicate_key == FINGERPRINT:
+            transactions = self.set_fingerprints(transactions)
+        return transactions
+
+    def read_file_from(
+        self, statement_file: IO, member: int = 0, offset: int = 0, skip: int = 0
+    ) -> Iterable["Transaction"]:
+        """Continue reading the file after a transaction read before, setting Transaction.source_member.
+
+        Files (ZIP members) before ``member`` are not read at all. Resumable readers continue reading
+        the member at ``offset``, others read it again skipping first ``skip`` transactions.
+        Fingerprints are not set, as they depend on all the preceding transactions.
+        """
+        for index, f in enumerate(self._open_files(statement_file)):
+            if index < member:
+                continue
+            start = offset if index == member and self.resumable else 0
+            if start:
+                f.seek(start, os.SEEK_SET)
+            transactions = self.read_transactions(f)
+            if index == member and not self.resumable:
+                transactions = itertools.islice(transactions, skip, None)
+            for transaction in transactions:
+                transaction.source_member = index
+                transaction.source_offset += start
+                yield transaction
+
+    def get_shards(self, statement_file: IO, shard_size: int) -> List[Tuple[int, int]]:
+        """Split the file into byte ranges of at least ``shard_size``, each starting at a record boundary."""
+        size = statement_file.seek(0, os.SEEK_END)
+        shards = []
+        start = 0
+        while start < size:
+            end = size
+            if start + shard_size < size:
+                # skip the rest of the line, which the position falls into
+                statement_file.seek(start + shard_size - 1)
+                statement_file.readline()
+                while True:
+                    position = statement_file.tell()
+                    line = statement_file.readline()
+                    if not line:
+                        break
+                    if self.is_record_start(line):
+                        end = position
+                        break
+            shards.append((start, end))
+            start = end
+        return shards
+
+    def is_record_start(self, line: bytes) -> bool:
+        """Return whether a range of the file may start with the line."""
+        return True
+
+    def get_shard_context(self, statement_file: IO, start: int) -> bytes:
+        """Return lines preceding the range, which are needed to read it (e.g. the header of the statement)."""
+        return b""
+
+    def read_shard(self, statement_file: IO, start: int, end: int) -> List["Transaction"]:
+        """Read transactions from the byte range of a single (not zipped) file.
+
+        Fingerprints are not set, as they depend on all the preceding transactions.
+        """
+        context = self.get_shard_context(statement_file, start)
+        statement_file.seek(start)
+        transactions = list(self.read_transactions(io.BytesIO(context + statement_file.read(end - start))))
+        for transaction in transactions:
+            transaction.source_offset += start - len(context)
+        return transactions
+
+    def _read_file(self, statement_file: IO, reader: str) -> Iterable["Transaction"]:
+        for f in self._open_files(statement_file, reader):
+            yield from self.read_transactions(f)
+
+    def _open_files(self, statement_file: IO, reader: str | None = None) -> Iterator[IO]:
+        """Yield the statement file or files unpacked from (nested) ZIP archives."""
         try:
             zip_file = ZipFile(statement_file)
         except BadZipFile:
             statement_file.seek(0)
-            yield from self.read_transactions(statement_file)
+            yield statement_file
         else:
             for zip_info in zip_file.filelist:
+                if reader is not None:
+                    metrics.inc("bankreader_zip_members_total", reader=reader)
                 with zip_file.open(zip_info) as f:
-                    yield from self.read_file(f)
+                    yield from self._open_files(f, reader)
 
     def read_transactions(self, statement_file: IO) -> Iterable["Transaction"]:
         raise NotImplementedError()
+
+    def read_balances(self, statement_file: IO) -> Tuple[Decimal | None, Decimal | None]:
+        """Return opening and closing balance of the statement file (of the first and the last statement in it)."""
+        opening_balance = closing_balance = None
+        for f in self._open_files(statement_file):
+            file_opening_balance, file_closing_balance = self.read_statement_balances(f)
+            if opening_balance is None:
+                opening_balance = file_opening_balance
+            if file_closing_balance is not None:
+                closing_balance = file_closing_balance
+        statement_file.seek(0)
+        return opening_balance, closing_balance
+
+    def read_statement_balances(self, statement_file: IO) -> Tuple[Decimal | None, Decimal | None]:
+        """Return opening and closing balance from the headers of the statement, if the format contains them."""
+        return None, None
+
+    def get_fingerprint(self, transaction: "Transaction", occurrence: int) -> str:
+        """Return stable hash of the transaction fields and its occurrence among identical transactions."""
+        values = []
+        for field in self.fingerprint_fields:
+            value = getattr(transaction, field)
+            values.append(format(value, ".2f") if isinstance(value, Decimal) else str(value))
+        values.append(str(occurrence))
+        return hashlib.sha256("\x1f".join(values).encode()).hexdigest()
+
+    def set_fingerprints(self, transactions: Iterable["Transaction"]) -> Iterable["Transaction"]:
+        """Set fingerprints of the transactions, which also replace missing transaction ids."""
+        # identical transactions within one statement (e.g. two equal payments) are distinguished by their order
+        occurrences: Counter = Counter()
+        for transaction in transactions:
+            key = self.get_fingerprint(transaction, 0)
+            occurrences[key] += 1
+            transaction.fingerprint = (
+                key if occurrences[key] == 1 else self.get_fingerprint(transaction, occurrences[key] - 1)
+            )
+            if not transaction.transaction_id:
+                transaction.transaction_id = transaction.fingerprint
+            yield transaction
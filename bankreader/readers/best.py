@@ -1,21 +1,37 @@
 import datetime
-import decimal
-from typing import IO, Iterable
+from decimal import Decimal
+from typing import IO, Iterable, Tuple
 
 from bankreader.models import Transaction
 
-from .base import BaseReader
+from .base import BaseReader, cents_to_decimal
 
 
 class BestReader(BaseReader):
     label = "Best"
     encoding = "cp1250"
+    incremental = True
+    resumable = True
+    shardable = True
+
+    def read_statement_balances(self, statement_file: IO) -> Tuple[Decimal | None, Decimal | None]:
+        opening_balance = closing_balance = None
+        for line in statement_file:
+            # header of a statement, balances are encoded as amounts of transactions (sign, 3 zeros, 15 digits)
+            if line[:2] == b"51":
+                row = line.decode(self.encoding)
+                if opening_balance is None:
+                    opening_balance = cents_to_decimal(-int(row[50:65]) if row[46] == "0" else int(row[50:65]))
+                closing_balance = cents_to_decimal(-int(row[69:84]) if row[65] == "0" else int(row[69:84]))
+        return opening_balance, closing_balance
 
     def read_transactions(self, statemen_file: IO) -> Iterable[Transaction]:
-        rows = statemen_file.read().decode(self.encoding).split("\n")
-        for row in rows:
-            if row[:2] == "52":
-                yield Transaction(
+        offset = 0
+        for line in statemen_file:
+            offset += len(line)
+            if line[:2] == b"52":
+                row = line.decode(self.encoding)
+                transaction = Transaction(
                     transaction_id=row[86:117].strip(),
                     entry_date=datetime.datetime.strptime(row[167:175], "%Y%m%d").date(),
                     accounted_date=datetime.datetime.strptime(row[175:183], "%Y%m%d").date(),
@@ -26,10 +42,13 @@ class BestReader(BaseReader):
                         row[42:46] if row[39:42] == "000" else row[39:46],
                     ),
                     # 'remote_account_name': row[],
-                    amount=decimal.Decimal("%s%s.%s" % ("-" if row[46] == "0" else "", row[50:63], row[63:65])),
+                    amount=cents_to_decimal(-int(row[50:65]) if row[46] == "0" else int(row[50:65])),
                     variable_symbol=int(row[127:137]),
                     constant_symbol=int(row[137:147]),
                     specific_symbol=int(row[147:157]),
                     sender_description=row[269:409].strip(),
                     recipient_description=row[209:239].strip(),
                 )
+                # reading may resume after the line
+                transaction.source_offset = offset
+                yield transaction
@@ -1,14 +1,13 @@
 import csv
 import datetime
-import decimal
-import re
+import functools
+from decimal import Decimal
 from logging import getLogger
-from typing import IO, Any, Dict, Iterable
+from typing import IO, Any, Callable, Dict, Iterable, List, Tuple
 
 from bankreader.models import Transaction
 
-from .base import BaseReader
-
+from .base import BaseReader, cents_to_decimal, parse_amount
 
 logger = getLogger(__name__)
 
@@ -21,14 +20,21 @@ class CsvReader(BaseReader):
     quotechar = '"'
     encoding = "utf-8"
     decimal_separator = "."
-    decimalregex = re.compile(r"[^0-9,-]")
+    incremental = True
+    # dates repeat a lot within statements, parsed dates are cached by their text
+    date_cache_size = 4096
 
     def __init__(self) -> None:
-        self.decimal_cleaner = re.compile(r"[^0-9-%s]" % self.decimal_separator)
+        super().__init__()
+        # readers are registered once per process, converters and header mappings are resolved once
+        self._converters: Dict[str, Callable[[str], Any]] | None = None
+        self._header_mappings: Dict[Tuple[str, ...], Dict[str, int] | None] = {}
 
     def read_transactions(self, statemen_file: IO) -> Iterable[Transaction]:
-        rows = statemen_file.read().decode(self.encoding).split("\n")
-        column_mapping: Dict[str, int] = {}
+        rows = (line.decode(self.encoding) for line in statemen_file)
+        converters = self.get_converters()
+        column_mapping: Dict[str, int] | None = None
+        columns: List[Tuple[str, int, Callable[[str], Any]]] = []
         csv_reader = csv.reader(rows, delimiter=self.delimiter, quotechar=self.quotechar)
         for row in csv_reader:
             # skip empty lines
@@ -36,25 +42,71 @@ class CsvReader(BaseReader):
                 continue
             # skip header until we find the column mapping
             if not column_mapping:
-                try:
-                    column_mapping = {key: row.index(csv_key) for key, csv_key in self.column_mapping.items()}
-                except ValueError:
-                    pass
+                column_mapping = self.get_header_mapping(row)
+                if column_mapping:
+                    columns = [(key, index, converters[key]) for key, index in column_mapping.items()]
                 continue
             # read individual transactions
             try:
-                data = {key: self.get_value(key, row[column_mapping[key]]) for key in column_mapping}
+                data = {key: convert(row[index]) for key, index, convert in columns}
             except IndexError:
                 logger.error("Error reading CSV file: %s", dict(row=row, column_mapping=column_mapping))
                 continue
             yield Transaction(**data)
 
+    def get_header_mapping(self, row: List[str]) -> Dict[str, int] | None:
+        """Return indexes of mapped columns if the row is the header, mappings of seen rows are cached."""
+        header = tuple(row)
+        try:
+            return self._header_mappings[header]
+        except KeyError:
+            pass
+        try:
+            column_mapping: Dict[str, int] | None = {
+                key: row.index(csv_key) for key, csv_key in self.column_mapping.items()
+            }
+        except ValueError:
+            column_mapping = None
+        # rows before the header may differ in every file, only headers are kept
+        if column_mapping is not None:
+            self._header_mappings[header] = column_mapping
+        return column_mapping
+
+    def get_converters(self) -> Dict[str, Callable[[str], Any]]:
+        """Return converter of each mapped column, resolved on the first use."""
+        if self._converters is None:
+            self._converters = {key: self.get_converter(key) for key in self.column_mapping}
+        return self._converters
+
+    def get_converter(self, key: str) -> Callable[[str], Any]:
+        if type(self).get_value is not CsvReader.get_value:
+            # keep conversions of readers overriding get_value()
+            return functools.partial(self.get_value, key)
+        if key in ("accounted_date", "entry_date"):
+            return functools.lru_cache(self.date_cache_size)(self.parse_date)
+        elif key == "amount":
+            return self.parse_amount
+        elif key.endswith("_symbol"):
+            return parse_symbol
+        else:
+            return str
+
+    def parse_date(self, value: str) -> datetime.date:
+        return datetime.datetime.strptime(value, self.date_format).date()
+
+    def parse_amount(self, value: str) -> Decimal:
+        return cents_to_decimal(parse_amount(value, self.decimal_separator))
+
     def get_value(self, key: str, value: str) -> Any:
         if key in ("accounted_date", "entry_date"):
-            return datetime.datetime.strptime(value, self.date_format).date()
+            return self.parse_date(value)
         elif key == "amount":
-            return decimal.Decimal(self.decimal_cleaner.sub("", value).replace(self.decimal_separator, "."))
+            return self.parse_amount(value)
         elif key.endswith("_symbol"):
-            return int(value) if value.isdigit() else 0
+            return parse_symbol(value)
         else:
             return value
+
+
+def parse_symbol(value: str) -> int:
+    return int(value) if value.isdigit() else 0
@@ -1,31 +1,86 @@
 import datetime
-from typing import IO, Iterable
+from decimal import Decimal
+from typing import IO, Any, Dict, Iterable, Tuple
 
 from bankreader.models import Transaction
 
-from .base import BaseReader
+from .base import BaseReader, cents_to_decimal
+
+# size of blocks searched backwards for the header of the statement
+HEADER_SEARCH_SIZE = 64 * 1024
+# sign of the amount by the accounting code: debit, credit, reversal (storno) of a debit and of a credit
+AMOUNT_SIGNS = {"1": -1, "2": 1, "4": 1, "5": -1}
+# reversals may repeat the transaction id of the reversed entry, which would make them duplicates of it
+REVERSAL_CODES = ("4", "5")
+REVERSAL_SUFFIX = "-storno"
 
 
 class GpcReader(BaseReader):
     label = "GPC"
+    incremental = True
+    has_source_account = True
+    resumable = True
+    shardable = True
+
+    def read_statement_balances(self, statement_file: IO) -> Tuple[Decimal | None, Decimal | None]:
+        opening_balance = closing_balance = None
+        for line in statement_file:
+            # header of a statement
+            if line[:3] == b"074":
+                row = line.decode(self.encoding)
+                if opening_balance is None:
+                    opening_balance = cents_to_decimal(int(row[59] + row[45:59]))
+                closing_balance = cents_to_decimal(int(row[74] + row[60:74]))
+        return opening_balance, closing_balance
+
+    def is_record_start(self, line: bytes) -> bool:
+        return line[:3] in (b"074", b"075")
+
+    def get_shard_context(self, statement_file: IO, start: int) -> bytes:
+        # the header of the statement the range belongs to gives the source account
+        end = start
+        while end > 0:
+            block_start = max(end - HEADER_SEARCH_SIZE, 0)
+            statement_file.seek(block_start)
+            block = statement_file.read(end - block_start)
+            index = block.rfind(b"\n074")
+            if index >= 0:
+                statement_file.seek(block_start + index + 1)
+                return statement_file.readline()
+            if block_start == 0:
+                if block[:3] == b"074":
+                    statement_file.seek(0)
+                    return statement_file.readline()
+                break
+            # blocks overlap, so that headers are found across block boundaries
+            end = block_start + 3
+        return b""
 
     def read_transactions(self, statemen_file: IO) -> Iterable[Transaction]:
-        rows = statemen_file.read().decode(self.encoding).split("\n")
         transaction = None
-        for row in rows:
+        source_account = ""
+        # offset of the current line, where reading may resume after the previous transaction
+        offset = 0
+        for line in statemen_file:
+            row = line.decode(self.encoding)
+            # header of a statement
+            if row[:3] == "074":
+                if transaction:
+                    yield self.get_transaction(transaction, source_account, offset)
+                    transaction = None
+                source_account = row[3:19]
             # first row of transaction data
-            if row[:3] == "075":
+            elif row[:3] == "075":
                 if transaction:
                     # send previous transaction data
-                    if "entry_date" not in transaction:
-                        transaction["entry_date"] = transaction["accounted_date"]
-                    yield Transaction(**transaction)
+                    yield self.get_transaction(transaction, source_account, offset)
                     transaction = None
-                if row[60] in "12":
+                # reversals are included in the balances of the statement just like other transactions
+                if row[60] in AMOUNT_SIGNS:
                     # create new transaction data
-                    amount = int(row[48:60]) / 100.0
+                    amount = int(row[48:60])
                     transaction = {
-                        "transaction_id": row[35:48],
+                        "transaction_id": row[35:48] + (REVERSAL_SUFFIX if row[60] in REVERSAL_CODES else ""),
                         "accounted_date": datetime.datetime.strptime(row[122:128], "%d%m%y").date(),
                         "remote_account_number": "%s-%s/%s"
                         % (
@@ -34,7 +89,7 @@ class GpcReader(BaseReader):
                             row[73:77],
                         ),
                         "remote_account_name": row[97:117].strip(),
-                        "amount": amount if row[60] == "2" else -amount,
+                        "amount": cents_to_decimal(AMOUNT_SIGNS[row[60]] * amount),
                         "variable_symbol": int(row[61:71]),
                         "constant_symbol": int(row[77:81]),
                         "specific_symbol": int(row[81:91]),
@@ -52,7 +107,14 @@ class GpcReader(BaseReader):
             # 4th row of transaction data
             elif transaction and row[:3] == "079":
                 transaction["recipient_description"] += row[3:73].strip()
+            offset += len(line)
         if transaction:
-            if "entry_date" not in transaction:
-                transaction["entry_date"] = transaction["accounted_date"]
-            yield Transaction(**transaction)
+            yield self.get_transaction(transaction, source_account, offset)
+
+    def get_transaction(self, data: Dict[str, Any], source_account: str, offset: int) -> Transaction:
+        if "entry_date" not in data:
+            data["entry_date"] = data["accounted_date"]
+        transaction = Transaction(**data)
+        transaction.source_account = source_account
+        transaction.source_offset = offset
+        return transaction
@@ -1,23 +1,35 @@
 import re
 from typing import IO, Iterable
 
+from mt940.models import Transactions
 from mt940.parser import parse as mt940_parse
+from mt940.processors import transactions_to_transaction
 
 from ..models import Transaction
-from .base import BaseReader
+from .base import FINGERPRINT, BaseReader
 
 
 class MT940Reader(BaseReader):
     label = "MT940 (MultiCash)"
+    has_source_account = True
+    # customer references are optional (NONREF) and not unique
+    duplicate_key = FINGERPRINT
+    # the account (:25:) of each statement in the file is copied to its transactions
+    processors = {
+        "post_statement": Transactions.DEFAULT_PROCESSORS["post_statement"]
+        + [transactions_to_transaction("account_identification")],
+    }
 
     def read_transactions(self, statement_file: IO) -> Iterable[Transaction]:
-        for transaction in mt940_parse(statement_file):
+        for transaction in mt940_parse(statement_file, processors=self.processors):
             purpose = transaction.data.get("purpose")
             symbols = dict(re.findall(r"([KVS]S) ([0-9]{10})", purpose))
             account_match = re.search(r"([0-9]+-)?([0-9]{10})/([0-9]{4})", purpose)
             description = re.split("([KVS]S [0-9]{10}){3}", purpose)[-1]
-            yield Transaction(
-                transaction_id=transaction.data.get("customer_reference"),
+            customer_reference = transaction.data.get("customer_reference")
+            bank_transaction = Transaction(
+                # NONREF means there is no reference, the missing id is replaced by the fingerprint
+                transaction_id="" if customer_reference in (None, "NONREF") else customer_reference,
                 entry_date=transaction.data.get("entry_date"),
                 accounted_date=transaction.data.get("date"),
                 remote_account_number=account_match.group() if account_match else "",
@@ -29,3 +41,5 @@ class MT940Reader(BaseReader):
                 sender_description=description,
                 recipient_description=description,
             )
+            bank_transaction.source_account = transaction.data.get("account_identification") or ""
+            yield bank_transaction
@@ -0,0 +1,87 @@
+"""
+Optional database router sending reads of bankreader models to a replica.
+
+Enable it in settings::
+
+    DATABASE_ROUTERS = ["bankreader.routers.ReplicaRouter"]
+    BANKREADER_REPLICA_DATABASE = "replica"
+    MIDDLEWARE = [..., "bankreader.middleware.ReadYourWritesMiddleware"]
+
+Writes, and reads inside a database transaction of the primary database (e.g. those of imports),
+go to ``BANKREADER_PRIMARY_DATABASE`` (``default``), as do reads of migrations. Within ``track_writes()``
+(the middleware wraps each request in it), reads go to the primary database as well once anything
+was actually written to it. The middleware keeps reads of the same client on the primary database for
+``BANKREADER_READ_YOUR_WRITES`` seconds after a write, so that e.g. the redirect after uploading
+a statement shows it, even if the replica lags behind. Reads of state shared between processes
+(checkpoints of resumable imports, jobs and leases of workers) use the primary database explicitly.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Iterator, Type
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, models
+
+APP_LABEL = "bankreader"
+
+# reads are routed to the primary database
+pinned: ContextVar[bool] = ContextVar("bankreader_pinned", default=False)
+# anything was written to the primary database within track_writes()
+written: ContextVar[bool] = ContextVar("bankreader_written", default=False)
+
+WRITE_STATEMENTS = ("INSERT", "UPDATE", "DELETE")
+
+
+def get_primary_database() -> str:
+    return getattr(settings, "BANKREADER_PRIMARY_DATABASE", DEFAULT_DB_ALIAS)
+
+
+def get_replica_database() -> str | None:
+    return getattr(settings, "BANKREADER_REPLICA_DATABASE", None)
+
+
+def detect_write(execute: Callable, sql: str, params: Any, many: bool, context: Any) -> Any:
+    if sql.lstrip()[:6].upper() in WRITE_STATEMENTS:
+        written.set(True)
+    return execute(sql, params, many, context)
+
+
+@contextmanager
+def track_writes() -> Iterator[None]:
+    """Route reads to the primary database after anything was written to it within the block."""
+    token = written.set(False)
+    try:
+        with connections[get_primary_database()].execute_wrapper(detect_write):
+            yield
+    finally:
+        written.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model: Type[models.Model], **hints: Any) -> str | None:
+        if model._meta.app_label != APP_LABEL:
+            return None
+        replica = get_replica_database()
+        primary = get_primary_database()
+        if (
+            replica is None
+            or pinned.get()
+            or written.get()
+            # historical models of migrations
+            or model.__module__ == "__fake__"
+            or connections[primary].in_atomic_block
+        ):
+            return primary
+        return replica
+
+    def db_for_write(self, model: Type[models.Model], **hints: Any) -> str | None:
+        if model._meta.app_label != APP_LABEL:
+            return None
+        return get_primary_database()
+
+    def allow_relation(self, obj1: models.Model, obj2: models.Model, **hints: Any) -> bool | None:
+        databases = {get_primary_database(), get_replica_database()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
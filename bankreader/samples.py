@@ -0,0 +1,149 @@
+"""
+Generators of synthetic account statement files, used for profiling and benchmarks.
+"""
+
+import datetime
+import io
+import random
+import zipfile
+from typing import Callable, Dict, List
+
+from .readers.base import BaseReader
+from .readers.best import BestReader
+from .readers.csv import CsvReader
+from .readers.gpc import GpcReader
+
+START_DATE = datetime.date(2020, 1, 1)
+
+
+def _set(line: List[str], start: int, value: str) -> None:
+    end = start + len(value)
+    line[start:end] = value
+
+
+def _get_date(i: int) -> datetime.date:
+    return START_DATE + datetime.timedelta(days=i * 365 // 100000)
+
+
+OPENING_BALANCE = 10**9
+
+
+def generate_gpc(rows: int, seed: int = 0) -> bytes:
+    rnd = random.Random(seed)
+    lines = []
+    debit = credit = 0
+    for i in range(rows):
+        date = _get_date(i).strftime("%d%m%y")
+        amount = rnd.randrange(1, 10**8)
+        sign = rnd.choice("12")
+        if sign == "1":
+            debit += amount
+        else:
+            credit += amount
+        lines.append(
+            "075"
+            + "0000001234567890"
+            + "%06d" % rnd.randrange(1000000)
+            + "%010d" % rnd.randrange(10**10)
+            + "%013d" % i
+            + "%012d" % amount
+            + sign
+            + "%010d" % rnd.randrange(10**10)
+            + "00"
+            + "%04d" % rnd.randrange(10000)
+            + "%04d" % rnd.randrange(10000)
+            + "%010d" % rnd.randrange(10**10)
+            + date
+            + ("Remote account %d" % rnd.randrange(1000)).ljust(20)[:20]
+            + "0"
+            + "0203"
+            + date
+        )
+        lines.append("076" + " " * 26 + date + ("Sender description %d" % i).ljust(92))
+        lines.append("078" + ("Recipient description %d" % i).ljust(124))
+    closing_balance = OPENING_BALANCE + credit - debit
+    header = (
+        "074"
+        + "0000001234567890"
+        + "SAMPLE".ljust(20)
+        + START_DATE.strftime("%d%m%y")
+        + "%014d%s" % (OPENING_BALANCE, "+")
+        + "%014d%s" % (abs(closing_balance), "+" if closing_balance >= 0 else "-")
+        + "%014d0" % debit
+        + "%014d0" % credit
+        + "001"
+        + _get_date(rows).strftime("%d%m%y")
+    )
+    lines.insert(0, header.ljust(128))
+    return ("\r\n".join(lines) + "\r\n").encode(GpcReader.encoding)
+
+
+def generate_best(rows: int, seed: int = 0, encoding: str = BestReader.encoding) -> bytes:
+    rnd = random.Random(seed)
+    lines = []
+    balance = OPENING_BALANCE
+    for i in range(rows):
+        date = _get_date(i).strftime("%Y%m%d")
+        line = [" "] * 409
+        _set(line, 0, "52")
+        _set(line, 23, "%06d%010d000%04d" % (rnd.randrange(10**6), rnd.randrange(10**10), rnd.randrange(10**4)))
+        sign, amount = rnd.choice("01"), rnd.randrange(1, 10**8)
+        balance += amount if sign == "1" else -amount
+        _set(line, 46, sign + "000" + "%015d" % amount)
+        _set(line, 86, "%031d" % i)
+        _set(line, 127, "%010d%010d%010d" % (rnd.randrange(10**10), rnd.randrange(10**4), rnd.randrange(10**10)))
+        _set(line, 167, date + date)
+        _set(line, 209, "Recipient description %d" % i)
+        _set(line, 269, "Sender description %d" % i)
+        lines.append("".join(line))
+    header = [" "] * 409
+    _set(header, 0, "51")
+    _set(header, 46, "1000" + "%015d" % OPENING_BALANCE)
+    _set(header, 65, ("1" if balance >= 0 else "0") + "000" + "%015d" % abs(balance))
+    lines.insert(0, "".join(header))
+    return ("\r\n".join(lines) + "\r\n").encode(encoding)
+
+
+def generate_csv(reader: CsvReader, rows: int, seed: int = 0) -> bytes:
+    rnd = random.Random(seed)
+    values: Dict[str, Callable[[int], str]] = {
+        "transaction_id": lambda i: "%d" % i,
+        "accounted_date": lambda i: _get_date(i).strftime(reader.date_format),
+        "entry_date": lambda i: _get_date(i).strftime(reader.date_format),
+        "remote_account_number": lambda i: "%d/%04d" % (rnd.randrange(10**10), rnd.randrange(10**4)),
+        "remote_account_name": lambda i: "Remote account %d" % rnd.randrange(1000),
+        "amount": lambda i: ("%.2f" % (rnd.randrange(-(10**7), 10**7) / 100)).replace(".", reader.decimal_separator),
+        "sender_description": lambda i: "Sender description %d" % i,
+        "recipient_description": lambda i: "Recipient description %d" % i,
+    }
+    output = io.StringIO()
+    output.write(reader.delimiter.join(reader.column_mapping.values()) + "\n")
+    for i in range(rows):
+        output.write(
+            reader.delimiter.join(
+                values[key](i) if key in values else "%d" % rnd.randrange(10**6) for key in reader.column_mapping
+            )
+            + "\n"
+        )
+    return output.getvalue().encode(reader.encoding)
+
+
+def generate(reader: BaseReader, rows: int, seed: int = 0) -> bytes:
+    """Generate statement file in the format of the reader."""
+    if isinstance(reader, GpcReader):
+        return generate_gpc(rows, seed)
+    if isinstance(reader, BestReader):
+        return generate_best(rows, seed, reader.encoding)
+    if isinstance(reader, CsvReader):
+        return generate_csv(reader, rows, seed)
+    raise NotImplementedError("Generating sample files is not supported for %s." % type(reader).__name__)
+
+
+def wrap_in_zip(data: bytes, name: str = "statement", depth: int = 1) -> bytes:
+    """Wrap data in given number of nested ZIP archives."""
+    for level in range(depth):
+        output = io.BytesIO()
+        with zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED) as zip_file:
+            zip_file.writestr("%s.%d" % (name, level), data)
+        data = output.getvalue()
+    return data
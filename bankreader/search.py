@@ -0,0 +1,68 @@
+"""
+Indexed search over transaction descriptions and counterparty names.
+
+SQLite uses a FTS5 table populated on import (deleted transactions are removed
+from it by a trigger), PostgreSQL uses trigram indexes
+(created by migrations) which serve the case insensitive substring lookups.
+Other backends fall back to plain case insensitive substring lookups.
+"""
+
+from typing import TYPE_CHECKING, Iterable
+
+from django.db import connections
+from django.db.models import Q, QuerySet
+from django.db.models.expressions import RawSQL
+
+if TYPE_CHECKING:
+    from .models import Transaction
+
+FTS_TABLE = "bankreader_transaction_fts"
+SEARCH_FIELDS = ("sender_description", "recipient_description", "remote_account_name")
+
+
+def has_fts(using: str) -> bool:
+    connection = connections[using]
+    if connection.vendor != "sqlite":
+        return False
+    # cached for the underlying connection, so that new connections notice tables created or dropped meanwhile
+    cached = getattr(connection, "bankreader_fts", None)
+    if cached is None or cached[0] is not connection.connection:
+        found = FTS_TABLE in connection.introspection.table_names()
+        cached = (connection.connection, found)
+        setattr(connection, "bankreader_fts", cached)
+    return cached[1]
+
+
+def get_fts_query(text: str) -> str:
+    """Convert user input into FTS5 query matching all words as prefixes."""
+    return " ".join('"%s"*' % word.replace('"', '""') for word in text.split())
+
+
+def index_transactions(transactions: Iterable["Transaction"], using: str = "default") -> None:
+    """Add saved transactions to the search index, where the index is maintained by the application."""
+    if not has_fts(using):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.executemany(
+            "INSERT OR REPLACE INTO %s (rowid, %s) VALUES (%%s, %%s, %%s, %%s)" % (FTS_TABLE, ", ".join(SEARCH_FIELDS)),
+            [
+                [transaction.pk, *(getattr(transaction, field) for field in SEARCH_FIELDS)]
+                for transaction in transactions
+            ],
+        )
+
+
+def search(queryset: QuerySet["Transaction"], text: str) -> QuerySet["Transaction"]:
+    """Filter transactions containing all words of the text in any of the searched fields."""
+    if not text.split():
+        return queryset
+    if has_fts(queryset.db):
+        return queryset.filter(
+            pk__in=RawSQL("SELECT rowid FROM %s WHERE %s MATCH %%s" % (FTS_TABLE, FTS_TABLE), [get_fts_query(text)])
+        )
+    for word in text.split():
+        q = Q()
+        for field in SEARCH_FIELDS:
+            q |= Q(**{f"{field}__icontains": word})
+        queryset = queryset.filter(q)
+    return queryset
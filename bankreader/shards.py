@@ -0,0 +1,39 @@
+"""
+Functions run in the processes of ``ingest.ShardedPipeline`` and of the ``reparsestatements`` command.
+
+The processes are started using spawn, so that they share neither threads nor database connections
+with the importing process. This module is imported in them before Django is set up (using the
+``DJANGO_SETTINGS_MODULE`` of the importing process), so it imports nothing from Django at the top.
+"""
+
+from typing import TYPE_CHECKING, Any, Dict, List, Type
+
+if TYPE_CHECKING:
+    from .models import Transaction
+    from .readers.base import BaseReader
+
+
+def setup() -> None:
+    import django
+
+    django.setup()
+
+
+def read_shard(reader: "BaseReader", path: str, start: int, end: int) -> List["Transaction"]:
+    """Read transactions from the byte range of the statement file."""
+    with open(path, "rb") as statement_file:
+        return reader.read_shard(statement_file, start, end)
+
+
+def parse_statement(reader_class: Type["BaseReader"], digest: str, fields: List[str]) -> List[Dict[str, Any]]:
+    """Read stored statement file and return values of the fields of its transactions in file order."""
+    from . import storage
+
+    # registered instances keep caches of the previous files, which can not be pickled
+    reader = reader_class()
+    values: List[Dict[str, Any]] = []
+    with storage.open_statement(digest) as statement_file:
+        for transaction in reader.read_file(statement_file):
+            transaction.set_missing_dates()
+            values.append({field: getattr(transaction, field) for field in fields})
+    return values
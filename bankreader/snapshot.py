@@ -0,0 +1,180 @@
+"""
+Columnar snapshots of transactions for analytics (requires numpy).
+
+A snapshot is a ``.npz`` file with one typed array per column:
+
+* ids, account ids, account statement ids and symbols as ``int64``
+* dates as ``datetime64[D]``
+* amounts and balances as ``int64`` minor units (cents), with ``balance_mask`` marking unknown balances
+* transaction ids as fixed width unicode strings
+* other strings dictionary encoded as ``<field>_codes`` (``int32``) and sorted ``<field>_values``,
+  which map directly to pandas ``Categorical.from_codes`` or Arrow ``DictionaryArray.from_arrays``
+
+Arrays prefixed by underscore describe the snapshot itself. Imports are not committed in the order
+of their ids, and resumable imports commit more transactions to the same statement later, so a snapshot
+is updated by appending those transactions of account statements updated since the previous snapshot
+(minus ``OVERLAP`` for imports committing after they saved the statement), which are not included yet.
+Changes of already included transactions (e.g. by ``reparsestatements``) and removed statements
+require a full rebuild.
+"""
+
+import datetime
+import importlib.util
+import os
+import tempfile
+from typing import Any, Dict, Iterable, List
+
+from django.db.models import QuerySet
+from django.utils import timezone
+
+from .models import AccountStatement, Transaction
+
+HAS_NUMPY = importlib.util.find_spec("numpy") is not None
+if HAS_NUMPY:
+    import numpy as np
+
+SNAPSHOT_VERSION = 2
+FETCH_SIZE = 10000
+OVERLAP = datetime.timedelta(minutes=10)
+
+INTEGER_FIELDS = ("id", "account_id", "account_statement_id", "variable_symbol", "constant_symbol", "specific_symbol")
+DATE_FIELDS = ("entry_date", "accounted_date")
+AMOUNT_FIELDS = ("amount", "balance")
+STRING_FIELDS = ("transaction_id",)
+DICTIONARY_FIELDS = ("remote_account_number", "remote_account_name", "sender_description", "recipient_description")
+FIELDS = INTEGER_FIELDS + DATE_FIELDS + AMOUNT_FIELDS + STRING_FIELDS + DICTIONARY_FIELDS
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def check_numpy() -> None:
+    if not HAS_NUMPY:
+        raise SnapshotError("Snapshots require numpy, install it using: pip install numpy")
+
+
+def get_queryset(
+    account_ids: Iterable[int], date_from: datetime.date | None, date_to: datetime.date | None
+) -> QuerySet[Transaction]:
+    queryset = Transaction.objects.all()
+    account_ids = list(account_ids)
+    if account_ids:
+        queryset = queryset.filter(account_id__in=account_ids)
+    if date_from is not None:
+        queryset = queryset.filter(accounted_date__gte=date_from)
+    if date_to is not None:
+        queryset = queryset.filter(accounted_date__lte=date_to)
+    return queryset
+
+
+def build_columns(queryset: QuerySet[Transaction]) -> Dict[str, Any]:
+    """Fetch the transactions as typed arrays, strings are not dictionary encoded yet."""
+    values: Dict[str, List[Any]] = {field: [] for field in FIELDS}
+    lists = [values[field] for field in FIELDS]
+    amount_index = FIELDS.index("amount")
+    balance_index = FIELDS.index("balance")
+    for row in queryset.order_by("account_statement_id", "id").values_list(*FIELDS).iterator(FETCH_SIZE):
+        row = list(row)
+        row[amount_index] = int(row[amount_index].scaleb(2))
+        if row[balance_index] is not None:
+            row[balance_index] = int(row[balance_index].scaleb(2))
+        for column, value in zip(lists, row):
+            column.append(value)
+    columns: Dict[str, Any] = {}
+    for field in INTEGER_FIELDS:
+        columns[field] = np.array(values[field], dtype="int64")
+    for field in DATE_FIELDS:
+        columns[field] = np.array(values[field], dtype="datetime64[D]")
+    columns["amount"] = np.array(values["amount"], dtype="int64")
+    columns["balance_mask"] = np.array([balance is None for balance in values["balance"]], dtype=bool)
+    columns["balance"] = np.array([balance or 0 for balance in values["balance"]], dtype="int64")
+    for field in STRING_FIELDS + DICTIONARY_FIELDS:
+        columns[field] = np.array(values[field], dtype=str)
+    return columns
+
+
+def encode(columns: Dict[str, Any], previous: Dict[str, Any] | None = None) -> Dict[str, Any]:
+    """Dictionary encode strings and append the columns to the previous snapshot, if given."""
+    encoded = {}
+    for field in INTEGER_FIELDS + DATE_FIELDS + AMOUNT_FIELDS + ("balance_mask",) + STRING_FIELDS:
+        encoded[field] = columns[field] if previous is None else np.concatenate([previous[field], columns[field]])
+    for field in DICTIONARY_FIELDS:
+        if previous is None:
+            encoded[f"{field}_values"], codes = np.unique(columns[field], return_inverse=True)
+        else:
+            # merged dictionary stays sorted, so that previous codes are remapped by a lookup
+            previous_values = previous[f"{field}_values"]
+            merged_values = np.unique(np.concatenate([previous_values, columns[field]]))
+            codes = np.concatenate(
+                [
+                    np.searchsorted(merged_values, previous_values)[previous[f"{field}_codes"]],
+                    np.searchsorted(merged_values, columns[field]),
+                ]
+            )
+            encoded[f"{field}_values"] = merged_values
+        encoded[f"{field}_codes"] = codes.astype("int32")
+    return encoded
+
+
+def load_snapshot(path: str, decode: bool = False) -> Dict[str, Any]:
+    """Load snapshot arrays, optionally replacing dictionary encoded strings by plain string arrays."""
+    check_numpy()
+    with np.load(path) as data:
+        columns = {name: data[name] for name in data.files}
+    if columns.get("_version") != SNAPSHOT_VERSION:
+        raise SnapshotError("Unsupported snapshot version in %s, it must be rebuilt." % path)
+    if decode:
+        for field in DICTIONARY_FIELDS:
+            columns[field] = columns.pop(f"{field}_values")[columns.pop(f"{field}_codes")]
+    return columns
+
+
+def write_snapshot(
+    path: str,
+    account_ids: Iterable[int] = (),
+    date_from: datetime.date | None = None,
+    date_to: datetime.date | None = None,
+    full: bool = False,
+    compress: bool = False,
+) -> int:
+    """Write (or update) snapshot of matching transactions and return the number of transactions added."""
+    check_numpy()
+    account_ids = sorted(account_ids)
+    meta = {
+        "_version": np.array(SNAPSHOT_VERSION),
+        "_accounts": np.array(account_ids, dtype="int64"),
+        "_date_from": np.array(date_from or "NaT", dtype="datetime64[D]"),
+        "_date_to": np.array(date_to or "NaT", dtype="datetime64[D]"),
+    }
+    queryset = get_queryset(account_ids, date_from, date_to)
+    # imports committed during the export are left for the next update
+    updated = timezone.now()
+    previous = None
+    if not full and os.path.exists(path):
+        previous = load_snapshot(path)
+        for name, value in meta.items():
+            if not np.array_equal(previous[name], value, equal_nan=name.startswith("_date")):
+                raise SnapshotError("The snapshot %s was made with different filters, it must be rebuilt." % path)
+        since = datetime.datetime.fromisoformat(str(previous["_updated"])) - OVERLAP
+        queryset = queryset.filter(
+            account_statement__in=AccountStatement.objects.filter(updated__gte=since).values("pk")
+        )
+    columns = build_columns(queryset)
+    if previous is not None:
+        # transactions committed within the overlap may be included already
+        new = ~np.isin(columns["id"], previous["id"])
+        columns = {field: column[new] for field, column in columns.items()}
+    snapshot = encode(columns, previous)
+    snapshot.update(meta)
+    snapshot["_updated"] = np.array(updated.isoformat())
+    directory = os.path.dirname(os.path.abspath(path))
+    with tempfile.NamedTemporaryFile(dir=directory, delete=False, suffix=".npz") as tmp:
+        try:
+            (np.savez_compressed if compress else np.savez)(tmp, **snapshot)
+            tmp.close()
+            os.replace(tmp.name, path)
+        except BaseException:
+            os.unlink(tmp.name)
+            raise
+    return len(columns["id"])
@@ -0,0 +1,101 @@
+"""
+Content-addressed store of raw account statement files.
+
+Files are stored gzip compressed in ``settings.BANKREADER_STATEMENT_STORE`` directory
+under their SHA-256 digest, so that they can be read again, e.g. after a reader is fixed.
+Nothing is stored if the setting is not set.
+"""
+
+import gzip
+import hashlib
+import os
+import shutil
+import tempfile
+from typing import IO, Tuple
+
+from django.conf import settings
+
+CHUNK_SIZE = 1 << 16
+# decompressed statements up to this size are kept in memory
+SPOOL_SIZE = 1 << 24
+
+
+def get_store_dir() -> str | None:
+    return getattr(settings, "BANKREADER_STATEMENT_STORE", None)
+
+
+def get_path(digest: str) -> str:
+    store_dir = get_store_dir()
+    assert store_dir is not None
+    return os.path.join(store_dir, digest[:2], digest + ".gz")
+
+
+class StatementWriter:
+    """Compute digest and size of a statement file written in chunks, store it if enabled."""
+
+    def __init__(self) -> None:
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self._tmp: IO[bytes] | None = None
+        self._gz: gzip.GzipFile | None = None
+        store_dir = get_store_dir()
+        if store_dir is not None:
+            os.makedirs(store_dir, exist_ok=True)
+            self._tmp = tempfile.NamedTemporaryFile(dir=store_dir, delete=False)
+            self._gz = gzip.GzipFile(fileobj=self._tmp, mode="wb")
+
+    def write(self, chunk: bytes) -> None:
+        self.digest.update(chunk)
+        self.size += len(chunk)
+        if self._gz is not None:
+            self._gz.write(chunk)
+
+    def close(self) -> Tuple[str, int]:
+        """Finish the stored file and return digest and size."""
+        if self._tmp is not None and self._gz is not None:
+            try:
+                self._gz.close()
+                self._tmp.close()
+                path = get_path(self.digest.hexdigest())
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(self._tmp.name, path)
+            except BaseException:
+                self.abort()
+                raise
+            self._tmp = self._gz = None
+        return self.digest.hexdigest(), self.size
+
+    def abort(self) -> None:
+        """Discard partially stored file."""
+        if self._tmp is not None:
+            self._tmp.close()
+            os.unlink(self._tmp.name)
+            self._tmp = self._gz = None
+
+
+def store_statement(statement_file: IO) -> Tuple[str, int]:
+    """Compute digest and size of the statement file, store it if enabled and rewind it."""
+    writer = StatementWriter()
+    statement_file.seek(0, os.SEEK_SET)
+    try:
+        for chunk in iter(lambda: statement_file.read(CHUNK_SIZE), b""):
+            writer.write(chunk)
+    except BaseException:
+        writer.abort()
+        raise
+    digest, size = writer.close()
+    statement_file.seek(0, os.SEEK_SET)
+    return digest, size
+
+
+def has_statement(digest: str) -> bool:
+    return get_store_dir() is not None and os.path.exists(get_path(digest))
+
+
+def open_statement(digest: str) -> IO:
+    """Open decompressed copy of the stored statement file, which supports fast seeking."""
+    statement_file: IO[bytes] = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+    with gzip.GzipFile(get_path(digest), "rb") as gz:
+        shutil.copyfileobj(gz, statement_file, CHUNK_SIZE)  # type: ignore[misc]
+    statement_file.seek(0, os.SEEK_SET)
+    return statement_file
@@ -0,0 +1,93 @@
+import datetime
+from typing import Any, Dict
+
+from django import template
+from django.contrib.admin.options import IS_POPUP_VAR, TO_FIELD_VAR
+from django.contrib.admin.templatetags.admin_list import date_hierarchy
+from django.contrib.admin.templatetags.base import InclusionAdminNode
+from django.contrib.admin.views.main import ORDER_VAR, ChangeList
+from django.template.base import Parser, Token
+from django.utils import formats
+from django.utils.text import capfirst
+from django.utils.translation import gettext as _
+
+from .. import date_index
+from ..models import Account
+
+register = template.Library()
+
+ACCOUNT_PARAMS = ("account__id__exact", "account_statement__account__id__exact")
+# parameters, which do not filter the transactions
+DISPLAY_PARAMS = (IS_POPUP_VAR, ORDER_VAR, TO_FIELD_VAR)
+
+
+def cached_date_hierarchy(cl: ChangeList) -> Dict[str, Any] | None:
+    """
+    Display the date hierarchy using the cached index of months instead of DISTINCT queries.
+
+    Only days of a selected month are read from the database. The index contains months of all
+    transactions of the accounts, so changelists filtered otherwise or searched use DISTINCT queries.
+    """
+    field_name = cl.date_hierarchy
+    year_field = "%s__year" % field_name
+    month_field = "%s__month" % field_name
+    year_lookup = cl.params.get(year_field)
+    month_lookup = cl.params.get(month_field)
+    if year_lookup and month_lookup:
+        return date_hierarchy(cl)
+    hierarchy_params = {year_field, month_field, "%s__day" % field_name}
+    if cl.query or any(
+        param not in ACCOUNT_PARAMS and param not in DISPLAY_PARAMS and param not in hierarchy_params
+        for param in cl.params
+    ):
+        return date_hierarchy(cl)
+
+    account_ids = [int(cl.params[param]) for param in ACCOUNT_PARAMS if cl.params.get(param, "").isdigit()]
+    if not account_ids:
+        account_ids = list(Account.objects.values_list("pk", flat=True))
+    months = sorted(
+        {month for account_months in date_index.get_months(account_ids).values() for month in account_months}
+    )
+
+    def link(filters: Dict[str, Any]) -> str:
+        return cl.get_query_string(filters, ["%s__" % field_name])
+
+    if not year_lookup and months:
+        # select appropriate start level
+        if len(months) == 1:
+            return date_hierarchy(cl)
+        if months[0][0] == months[-1][0]:
+            year_lookup = str(months[0][0])
+
+    if year_lookup:
+        return {
+            "show": True,
+            "back": {"link": link({}), "title": _("All dates")},
+            "choices": [
+                {
+                    "link": link({year_field: year_lookup, month_field: month}),
+                    "title": capfirst(formats.date_format(datetime.date(year, month, 1), "YEAR_MONTH_FORMAT")),
+                }
+                for year, month in months
+                if str(year) == year_lookup
+            ],
+        }
+    return {
+        "show": True,
+        "back": None,
+        "choices": [
+            {"link": link({year_field: str(year)}), "title": str(year)}
+            for year in sorted({year for year, month in months})
+        ],
+    }
+
+
+@register.tag(name="cached_date_hierarchy")
+def cached_date_hierarchy_tag(parser: Parser, token: Token) -> InclusionAdminNode:
+    return InclusionAdminNode(
+        parser,
+        token,
+        func=cached_date_hierarchy,
+        template_name="date_hierarchy.html",
+        takes_context=False,
+    )
@@ -0,0 +1,142 @@
+"""
+Test kit for custom readers, checking both their output and their speed.
+
+Combine ``ReaderTestMixin`` with ``unittest.TestCase`` (or any Django test case)::
+
+    class KbCsvReaderTest(ReaderTestMixin, SimpleTestCase):
+        reader = "bankreader_demo.demoapp.readers.KbCsvReader"
+        samples_dir = os.path.join(os.path.dirname(__file__), "samples", "kb_csv")
+
+Each sample file in ``samples_dir`` is compared field by field with the expected
+transactions stored next to it in ``<sample file>.json``. The speed of reading
+generated statements is compared with the baseline stored in ``baseline.json``.
+Run the tests with ``BANKREADER_UPDATE_GOLDEN=1`` to (re)write expected outputs
+and baseline from the current reader.
+"""
+
+import datetime
+import io
+import json
+import os
+import time
+import unittest
+from decimal import Decimal
+from typing import TYPE_CHECKING, Any, Dict, List
+
+from .models import Transaction
+from .readers import readers
+from .readers.base import BaseReader
+from .samples import generate
+
+EXPECTED_SUFFIX = ".json"
+BASELINE_FILE = "baseline.json"
+UPDATE_ENV = "BANKREADER_UPDATE_GOLDEN"
+
+FIELDS = tuple(field.name for field in Transaction._meta.fields if not field.primary_key and not field.is_relation)
+
+
+def serialize_value(value: Any) -> Any:
+    if isinstance(value, (datetime.date, Decimal)):
+        return str(value)
+    return value
+
+
+def read_sample(reader: BaseReader, path: str) -> List[Dict[str, Any]]:
+    """Read the sample file and return transactions as JSON serializable dicts."""
+    with open(path, "rb") as f:
+        return [
+            {field: serialize_value(getattr(transaction, field)) for field in FIELDS}
+            for transaction in reader.read_file(f)
+        ]
+
+
+def measure_rows_per_second(reader: BaseReader, data: bytes, repeat: int = 3) -> float:
+    """Return the best speed of reading the statement data out of several runs."""
+    best = 0.0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = sum(1 for _ in reader.read_file(io.BytesIO(data)))
+        duration = time.perf_counter() - start
+        best = max(best, rows / duration if duration else float("inf"))
+    return best
+
+
+if TYPE_CHECKING:
+    MixinBase = unittest.TestCase
+else:
+    MixinBase = object
+
+
+class ReaderTestMixin(MixinBase):
+    # reader key or instance
+    reader: str | BaseReader
+    # directory with sample files, expected outputs and performance baseline
+    samples_dir: str
+    # rows of the generated statement used for measuring speed, 0 disables the performance test
+    perf_rows = 10000
+    # minimum speed in rows per second regardless of the baseline
+    min_rows_per_second = 0.0
+    # allowed slowdown against the baseline
+    tolerance = 0.5
+
+    def get_reader(self) -> BaseReader:
+        return readers[self.reader] if isinstance(self.reader, str) else self.reader
+
+    def get_sample_files(self) -> List[str]:
+        return sorted(
+            os.path.join(self.samples_dir, name)
+            for name in os.listdir(self.samples_dir)
+            if not name.endswith(EXPECTED_SUFFIX)
+        )
+
+    def update_golden(self) -> bool:
+        return bool(os.environ.get(UPDATE_ENV))
+
+    def test_golden_files(self) -> None:
+        reader = self.get_reader()
+        sample_files = self.get_sample_files()
+        self.assertTrue(sample_files, "No sample files in %s." % self.samples_dir)
+        for path in sample_files:
+            actual = read_sample(reader, path)
+            expected_path = path + EXPECTED_SUFFIX
+            if self.update_golden():
+                with open(expected_path, "w") as f:
+                    json.dump(actual, f, ensure_ascii=False, indent=2)
+                continue
+            if not os.path.exists(expected_path):
+                self.fail("Missing expected output %s, run with %s=1 to create it." % (expected_path, UPDATE_ENV))
+            with open(expected_path) as f:
+                expected = json.load(f)
+            name = os.path.basename(path)
+            self.assertEqual(len(actual), len(expected), "%s: number of transactions" % name)
+            for row, (actual_values, expected_values) in enumerate(zip(actual, expected), 1):
+                for field in FIELDS:
+                    self.assertEqual(
+                        actual_values[field],
+                        expected_values.get(field),
+                        "%s: transaction %d, field %s" % (name, row, field),
+                    )
+
+    def test_performance(self) -> None:
+        if not self.perf_rows:
+            return
+        reader = self.get_reader()
+        try:
+            data = generate(reader, self.perf_rows)
+        except NotImplementedError as e:
+            self.skipTest(str(e))
+        rows_per_second = measure_rows_per_second(reader, data)
+        baseline_path = os.path.join(self.samples_dir, BASELINE_FILE)
+        if self.update_golden():
+            with open(baseline_path, "w") as f:
+                json.dump({"rows_per_second": round(rows_per_second)}, f, indent=2)
+            return
+        self.assertGreaterEqual(rows_per_second, self.min_rows_per_second, "rows per second")
+        if os.path.exists(baseline_path):
+            with open(baseline_path) as f:
+                baseline = json.load(f)["rows_per_second"]
+            self.assertGreaterEqual(
+                rows_per_second,
+                baseline * (1 - self.tolerance),
+                "rows per second, baseline %d" % baseline,
+            )
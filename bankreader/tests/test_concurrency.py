@@ -0,0 +1,66 @@
+import io
+import threading
+from decimal import Decimal
+from typing import List
+
+from django.db import connection, connections
+from django.test import TransactionTestCase
+
+from ..ingest import Pipeline
+from ..models import Account, Transaction
+from ..readers import register_reader
+from ..readers.gpc import GpcReader
+from ..samples import OPENING_BALANCE, generate_gpc
+
+GPC_READER = "bankreader.readers.gpc.GpcReader"
+register_reader(GpcReader)
+
+
+class ConcurrentImportTest(TransactionTestCase):
+    """Parallel imports of overlapping statements to several accounts."""
+
+    accounts_count = 3
+    imports_per_account = 4
+    rows = 300
+
+    def setUp(self) -> None:
+        if connection.vendor == "sqlite" and connection.is_in_memory_db():  # type: ignore
+            # connections of other threads to a shared in-memory database fail instead of waiting for locks
+            self.skipTest("Concurrent imports require a database file or a database server.")
+
+    def test_overlapping_imports(self) -> None:
+        accounts = [
+            Account.objects.create(name="Account %d" % i, reader=GPC_READER) for i in range(self.accounts_count)
+        ]
+        # statements of the same seed share their first transactions
+        statements = [generate_gpc(self.rows * (i % 2 + 1), seed=1) for i in range(self.imports_per_account)]
+        errors: List[Exception] = []
+
+        def load(account: Account, data: bytes, file_name: str) -> None:
+            try:
+                Pipeline(account).run(io.BytesIO(data), file_name)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connections.close_all()
+
+        threads = [
+            threading.Thread(target=load, args=(account, data, "statement-%d.gpc" % i))
+            for account in accounts
+            for i, data in enumerate(statements)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        for account in accounts:
+            transactions = list(
+                Transaction.objects.filter(account=account).order_by("transaction_id").values_list("amount", "balance")
+            )
+            # each transaction is stored once, with running balance of the longest statement
+            self.assertEqual(len(transactions), self.rows * 2)
+            balance = Decimal(OPENING_BALANCE) / 100
+            for amount, transaction_balance in transactions:
+                balance += amount
+                self.assertEqual(transaction_balance, balance)
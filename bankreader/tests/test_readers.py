@@ -0,0 +1,13 @@
+import os
+
+from django.test import SimpleTestCase
+
+from ..readers.gpc import GpcReader
+from ..testing import ReaderTestMixin
+
+
+class GpcReaderTest(ReaderTestMixin, SimpleTestCase):
+    reader = GpcReader()
+    samples_dir = os.path.join(os.path.dirname(__file__), "samples", "gpc")
+    # speed is only checked against baselines measured on the same machine
+    perf_rows = 1000
@@ -0,0 +1,232 @@
+"""
+Upload handler reading account statements while they are being uploaded.
+
+With the default upload handlers, an uploaded statement is received completely (into memory
+or a temporary file) before the reader starts. ``StatementUploadHandler`` passes chunks of the
+statement file to the reader of the account running in background threads as they arrive,
+so that reading overlaps with the transfer. The uploaded file itself is not kept anywhere,
+except in the statement store if it is enabled.
+
+Only incremental readers (reading the file line by line) are fed while uploading. ZIP archives,
+which can not be read before they are complete, are received into a spooled temporary file.
+"""
+
+import io
+import queue
+import tempfile
+import threading
+import time
+from decimal import Decimal
+from typing import Any, Dict, List
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopFutureHandlers
+from django.http import HttpRequest
+
+from . import metrics, storage
+from .models import Account, Transaction
+from .readers.base import BaseReader
+
+# chunks waiting for each reading thread
+QUEUE_SIZE = 16
+ZIP_SIGNATURE = b"PK"
+
+
+class ChunkStream(io.RawIOBase):
+    """Readable stream of chunks passed by another thread, reads block until they arrive."""
+
+    def __init__(self, queue_size: int = QUEUE_SIZE) -> None:
+        super().__init__()
+        self._chunks: queue.Queue = queue.Queue(queue_size)
+        self._chunk = memoryview(b"")
+        self._eof = False
+        self._discarded = threading.Event()
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: Any) -> int:
+        while not self._chunk:
+            if self._eof:
+                return 0
+            chunk = self._chunks.get()
+            if chunk is None:
+                self._eof = True
+            else:
+                self._chunk = memoryview(chunk)
+        size = min(len(buffer), len(self._chunk))
+        buffer[:size] = self._chunk[:size]
+        self._chunk = self._chunk[size:]
+        return size
+
+    def put(self, chunk: bytes | None) -> None:
+        """Pass the chunk (None at the end) to the reading thread, unless it stopped reading."""
+        while not self._discarded.is_set():
+            try:
+                self._chunks.put(chunk, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def discard(self) -> None:
+        """Drop all further chunks, called by the reading thread once it is done."""
+        self._discarded.set()
+
+
+class StreamedStatement:
+    """Statement file read in background threads from the chunks passed to feed()."""
+
+    def __init__(self, account: Account, reader: BaseReader) -> None:
+        self.account = account
+        self.reader = reader
+        self.digest = ""
+        self.size = 0
+        self.transactions: List[Transaction] = []
+        self.opening_balance: Decimal | None = None
+        self.closing_balance: Decimal | None = None
+        # time spent reading after the upload was complete
+        self.read_duration = 0.0
+        self._writer = storage.StatementWriter()
+        self._errors: List[Exception] = []
+        self._streams = (ChunkStream(), ChunkStream())
+        self._threads = (
+            threading.Thread(target=self._read_transactions, name="bankreader-upload", daemon=True),
+            threading.Thread(target=self._read_balances, name="bankreader-upload-balances", daemon=True),
+        )
+        self._finished_at: float | None = None
+
+    def start(self) -> None:
+        for thread in self._threads:
+            thread.start()
+
+    def feed(self, chunk: bytes) -> None:
+        self._writer.write(chunk)
+        for stream in self._streams:
+            stream.put(chunk)
+
+    def finish(self) -> None:
+        """Mark the end of the upload, reading goes on in the background."""
+        self.digest, self.size = self._writer.close()
+        for stream in self._streams:
+            stream.put(None)
+        self._finished_at = time.monotonic()
+        reader = "%s.%s" % (type(self.reader).__module__, type(self.reader).__name__)
+        metrics.inc("bankreader_bytes_processed_total", self.size, reader=reader)
+
+    def abort(self) -> None:
+        """Stop reading of an interrupted or unused upload."""
+        if self._finished_at is None:
+            self._writer.abort()
+        for stream in self._streams:
+            stream.put(None)
+        for thread in self._threads:
+            if thread.is_alive():
+                thread.join()
+
+    def wait(self) -> List[Transaction]:
+        """Wait until the statement is read and return its transactions, re-raising any reading error."""
+        assert self._finished_at is not None
+        for thread in self._threads:
+            thread.join()
+        self.read_duration = max(time.monotonic() - self._finished_at, 0.0)
+        if self._errors:
+            raise self._errors[0]
+        return self.transactions
+
+    def _read_transactions(self) -> None:
+        stream = self._streams[0]
+        try:
+            self.transactions.extend(self.reader.read_stream(io.BufferedReader(stream)))
+        except Exception as e:
+            self._errors.append(e)
+        finally:
+            stream.discard()
+
+    def _read_balances(self) -> None:
+        stream = self._streams[1]
+        try:
+            self.opening_balance, self.closing_balance = self.reader.read_statement_balances(io.BufferedReader(stream))
+        except Exception as e:
+            self._errors.append(e)
+        finally:
+            stream.discard()
+
+
+class StreamedUploadedFile(UploadedFile):
+    """Uploaded statement file, which was (or is being) read instead of being kept."""
+
+    def __init__(
+        self,
+        streamed: StreamedStatement,
+        name: str | None,
+        content_type: str | None,
+        size: int,
+        charset: str | None,
+        content_type_extra: Dict[str, str] | None,
+    ) -> None:
+        super().__init__(None, name, content_type, size, charset, content_type_extra)
+        self.streamed = streamed
+
+    def close(self) -> None:
+        self.streamed.abort()
+
+
+class StatementUploadHandler(FileUploadHandler):
+    """Read the statement file with the reader of the account while it is being uploaded."""
+
+    def __init__(self, request: HttpRequest, account: Account, field_name: str = "statement") -> None:
+        super().__init__(request)
+        self.account = account
+        self.reader = account.get_reader()
+        self.statement_field_name = field_name
+        self.active = False
+        self.streamed: StreamedStatement | None = None
+        self.spooled: Any = None
+
+    def new_file(self, field_name: str, *args: Any, **kwargs: Any) -> None:
+        super().new_file(field_name, *args, **kwargs)
+        self.active = field_name == self.statement_field_name and self.reader is not None and self.reader.incremental
+        if self.active:
+            self.streamed = self.spooled = None
+            # the statement file is received only by this handler
+            raise StopFutureHandlers()
+
+    def receive_data_chunk(self, raw_data: bytes, start: int) -> bytes | None:
+        if not self.active:
+            return raw_data
+        if start == 0:
+            assert self.reader is not None
+            if raw_data.startswith(ZIP_SIGNATURE):
+                self.spooled = tempfile.SpooledTemporaryFile(
+                    max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE, dir=settings.FILE_UPLOAD_TEMP_DIR
+                )
+            else:
+                self.streamed = StreamedStatement(self.account, self.reader)
+                self.streamed.start()
+        if self.streamed is not None:
+            self.streamed.feed(raw_data)
+        else:
+            self.spooled.write(raw_data)
+        return None
+
+    def file_complete(self, file_size: int) -> UploadedFile | None:
+        if not self.active:
+            return None
+        self.active = False
+        if self.streamed is not None:
+            self.streamed.finish()
+            return StreamedUploadedFile(
+                self.streamed, self.file_name, self.content_type, file_size, self.charset, self.content_type_extra
+            )
+        statement_file = self.spooled if self.spooled is not None else io.BytesIO()
+        statement_file.seek(0)
+        return UploadedFile(
+            statement_file, self.file_name, self.content_type, file_size, self.charset, self.content_type_extra
+        )
+
+    def upload_interrupted(self) -> None:
+        if self.streamed is not None:
+            self.streamed.abort()
+        if self.spooled is not None:
+            self.spooled.close()
@@ -0,0 +1,13 @@
+from django.urls import path
+
+from . import api
+from .views import metrics_view
+
+app_name = "bankreader"
+
+urlpatterns = [
+    path("metrics", metrics_view, name="metrics"),
+    path("api/accounts", api.accounts, name="api-accounts"),
+    path("api/account-statements", api.account_statements, name="api-account-statements"),
+    path("api/transactions", api.transactions, name="api-transactions"),
+]
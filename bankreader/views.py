@@ -0,0 +1,24 @@
+import hmac
+
+from django.conf import settings
+from django.http import HttpRequest, HttpResponse
+
+from . import metrics
+
+METRICS_PERMISSION = "bankreader.view_importrun"
+
+
+def has_metrics_access(request: HttpRequest) -> bool:
+    """Allow scrapers sending ``Authorization: Bearer <BANKREADER_METRICS_TOKEN>`` and permitted staff users."""
+    token = getattr(settings, "BANKREADER_METRICS_TOKEN", None)
+    authorization = request.META.get("HTTP_AUTHORIZATION", "")
+    if token and hmac.compare_digest(authorization.encode(), ("Bearer %s" % token).encode()):
+        return True
+    user = getattr(request, "user", None)
+    return user is not None and user.is_staff and user.has_perm(METRICS_PERMISSION)
+
+
+def metrics_view(request: HttpRequest) -> HttpResponse:
+    if not has_metrics_access(request):
+        return HttpResponse("Permission denied.\n", status=403, content_type="text/plain; charset=utf-8")
+    return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,193 @@
+"""
+Database-backed queue of statement files imported by ``bankreaderworker`` processes.
+
+Any number of workers on any number of nodes may run at once. A worker claims a job
+for a lease period, using ``SELECT ... FOR UPDATE SKIP LOCKED`` where the backend
+supports it. Claims are also guarded by a conditional update, so that two workers
+never run the same job. Jobs of workers which died are claimed again after their
+lease expires. Failed jobs are retried with increasing delay up to ``max_attempts``.
+
+While a job runs, a heartbeat thread renews its lease, so imports may take longer than
+the lease. The import is only committed if the job is still leased to the worker then,
+so that a worker which lost its lease (e.g. after being stuck) never commits a job
+claimed by another worker meanwhile.
+"""
+
+import datetime
+import logging
+import os
+import socket
+import threading
+from typing import IO, Any, List
+
+from django.db import connections, router, transaction as db_transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.translation import gettext
+
+from . import storage
+from .ingest import IngestError, IngestResult, Pipeline
+from .models import Account, AccountStatement, IngestJob
+
+# number of jobs considered by a single claim on backends without SKIP LOCKED
+CLAIM_CANDIDATES = 10
+RETRY_DELAY = datetime.timedelta(minutes=1)
+DEFAULT_LEASE = datetime.timedelta(minutes=10)
+
+logger = logging.getLogger(__name__)
+
+
+class LeaseLost(Exception):
+    """The job is no longer leased to the worker running it."""
+
+
+def get_worker_name() -> str:
+    return "%s:%d" % (socket.gethostname(), os.getpid())
+
+
+def enqueue_file(account: Account, path: str) -> IngestJob:
+    """Queue statement file, which must be accessible from all workers under the same path."""
+    return IngestJob.objects.create(account=account, file_name=os.path.basename(path), path=os.path.abspath(path))
+
+
+def enqueue_upload(account: Account, statement_file: IO, file_name: str) -> IngestJob:
+    """Queue uploaded statement file, which is kept in the statement store."""
+    if storage.get_store_dir() is None:
+        raise IngestError(gettext("Setting BANKREADER_STATEMENT_STORE is required to queue uploaded files."))
+    digest, _ = storage.store_statement(statement_file)
+    return IngestJob.objects.create(account=account, file_name=file_name, digest=digest)
+
+
+def claim_job(worker: str, lease: datetime.timedelta) -> IngestJob | None:
+    """Lease the next available job to the worker."""
+    now = timezone.now()
+    # jobs and their leases are read from the primary database, a replica may lag behind claims of other workers
+    db = router.db_for_write(IngestJob)
+    queryset = (
+        IngestJob.objects.using(db)
+        .filter(Q(status=IngestJob.PENDING, available_at__lte=now) | Q(status=IngestJob.RUNNING, leased_until__lt=now))
+        .order_by("available_at", "pk")
+    )
+    if connections[db].features.has_select_for_update_skip_locked:
+        with db_transaction.atomic(using=db):
+            return _claim_candidates(list(queryset.select_for_update(skip_locked=True)[:1]), worker, now + lease)
+    # without a read transaction, which would fail to upgrade to write lock on SQLite
+    return _claim_candidates(list(queryset[:CLAIM_CANDIDATES]), worker, now + lease)
+
+
+def _claim_candidates(candidates: List[IngestJob], worker: str, leased_until: datetime.datetime) -> IngestJob | None:
+    for job in candidates:
+        # attempts works as a version, the update fails if another worker claimed the job meanwhile
+        # leased_until changes with each renewal of the lease by the running worker
+        claimed = IngestJob.objects.filter(
+            pk=job.pk, status=job.status, attempts=job.attempts, leased_until=job.leased_until
+        )
+        if job.attempts >= job.max_attempts:
+            # the worker died while running the last attempt
+            claimed.update(status=IngestJob.FAILED, error=gettext("The lease expired."))
+            continue
+        if claimed.update(
+            status=IngestJob.RUNNING,
+            attempts=F("attempts") + 1,
+            leased_until=leased_until,
+            worker=worker,
+        ):
+            # with its account, which a lagging replica may not have yet
+            return IngestJob.objects.using(router.db_for_write(IngestJob)).select_related("account").get(pk=job.pk)
+    return None
+
+
+def renew_lease(job: IngestJob, worker: str, lease: datetime.timedelta) -> bool:
+    """Extend the lease of the job, return False if it is no longer leased to the worker."""
+    return bool(
+        IngestJob.objects.filter(pk=job.pk, status=IngestJob.RUNNING, worker=worker, attempts=job.attempts).update(
+            leased_until=timezone.now() + lease
+        )
+    )
+
+
+class LeaseHeartbeat:
+    """Thread renewing the lease of a running job, using its own database connection."""
+
+    def __init__(self, job: IngestJob, worker: str, lease: datetime.timedelta) -> None:
+        self.job = job
+        self.worker = worker
+        self.lease = lease
+        self.lost = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="bankreader-heartbeat", daemon=True)
+
+    def __enter__(self) -> "LeaseHeartbeat":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        try:
+            while not self._stopped.wait(self.lease.total_seconds() / 3):
+                try:
+                    if not renew_lease(self.job, self.worker, self.lease):
+                        self.lost.set()
+                        return
+                except Exception:
+                    # e.g. SQLite is locked by the import, the lease is renewed when it commits
+                    logger.warning("Failed to renew the lease of job %s.", self.job.pk, exc_info=True)
+        finally:
+            connections.close_all()
+
+
+class LeasedPipeline(Pipeline):
+    """Pipeline committing the import only while the job is still leased to the worker."""
+
+    def __init__(self, job: IngestJob, worker: str, lease: datetime.timedelta, heartbeat: LeaseHeartbeat) -> None:
+        super().__init__(job.account)
+        self.job = job
+        self.worker = worker
+        self.lease = lease
+        self.heartbeat = heartbeat
+
+    def complete(self, account_statement: AccountStatement, result: IngestResult) -> None:
+        super().complete(account_statement, result)
+        # renewed in the import transaction, so that claims by other workers fail until it is committed
+        if self.heartbeat.lost.is_set() or not renew_lease(self.job, self.worker, self.lease):
+            raise LeaseLost(gettext("The job is no longer leased to worker {}.").format(self.worker))
+
+
+def run_job(job: IngestJob, worker: str, lease: datetime.timedelta = DEFAULT_LEASE) -> IngestResult | None:
+    """Import the statement file of the job and record the outcome."""
+    heartbeat = LeaseHeartbeat(job, worker, lease)
+    pipeline = LeasedPipeline(job, worker, lease, heartbeat)
+    result = None
+    status = IngestJob.DONE
+    error = ""
+    available_at = job.available_at
+    try:
+        if job.digest:
+            statement_file = storage.open_statement(job.digest)
+        else:
+            statement_file = open(job.path, "rb")
+        with statement_file, heartbeat:
+            result = pipeline.run(statement_file, job.file_name)
+    except IngestError as e:
+        # retrying does not help to read a broken file
+        status = IngestJob.FAILED
+        error = str(e)
+    except Exception as e:
+        error = str(e)
+        if job.attempts < job.max_attempts:
+            status = IngestJob.PENDING
+            available_at = timezone.now() + RETRY_DELAY * job.attempts
+        else:
+            status = IngestJob.FAILED
+    # the job is only updated while it is still leased to this worker
+    IngestJob.objects.filter(pk=job.pk, worker=worker, attempts=job.attempts).update(
+        status=status,
+        error=error,
+        available_at=available_at,
+        leased_until=None,
+        import_run=pipeline.import_run if pipeline.import_run is not None and pipeline.import_run.pk else None,
+    )
+    return result